@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import mock_cristin_server
+
+# Kjører høsteskriptene mot mock_cristin_server og måler gjennomstrømning.
+# Hvert skript kjøres som egen prosess, slik at veggtid og minnetopp gjelder kun den kjøringen.
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+EGEN_UNIT = "1.0.0.0"
+
+
+def scenarier(args):
+    felles = ["--no-cache", "--concurrency", str(args.concurrency), "--prefetch", str(args.prefetch)]
+    if args.rate:
+        felles += ["--rate", str(args.rate), "--max-rate", str(max(args.rate, args.max_rate or 0))]
+    return {
+        "persons": ["cristin_fetcher.py"] + felles,
+        "unit-lite": ["hent_unit_publikasjoner.py", "--unit", EGEN_UNIT, "--start", str(args.start),
+                      "--end", str(args.end), "--lite"] + felles,
+        "unit-full": ["hent_unit_publikasjoner.py", "--unit", EGEN_UNIT, "--start", str(args.start),
+                      "--end", str(args.end)] + felles,
+        "collab": ["samarbeid_analyse.py", "--unit", EGEN_UNIT, "--start", str(args.start),
+                   "--end", str(args.end)] + felles,
+    }
+
+
+def kjor_scenario(navn, kommando, mock, base, arbeidskatalog):
+    mock.nullstill()
+    miljo = {**os.environ, "CRISTIN_API_BASE": base}
+    start = time.perf_counter()
+    with open(os.path.join(arbeidskatalog, f"{navn}.log"), "w", encoding="utf-8") as logg:
+        prosess = subprocess.Popen([sys.executable, os.path.join(KATALOG, kommando[0])] + kommando[1:],
+                                   cwd=arbeidskatalog, env=miljo, stdout=logg, stderr=subprocess.STDOUT)
+        _, status, ressurser = os.wait4(prosess.pid, 0)
+    veggtid = time.perf_counter() - start
+    forespørsler = mock.teller["totalt"]
+    return {
+        "scenario": navn,
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "requests": forespørsler,
+        "requests_per_sec": round(forespørsler / veggtid, 1) if veggtid else None,
+        "wall_time_s": round(veggtid, 3),
+        "peak_memory_mb": round(ressurser.ru_maxrss / 1024, 1),  # ru_maxrss er i KiB på Linux
+        "bytes_served": mock.teller["bytes"],
+        "injected_503": mock.teller["503"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark høsteskriptene mot en lokal mock av Cristin API-et.")
+    parser.add_argument("--scenario", nargs="*", choices=["persons", "unit-lite", "unit-full", "collab"],
+                        help="Hvilke scenarier som kjøres (standard: alle)")
+    parser.add_argument("--results", type=int, default=2000, help="Antall syntetiske resultater")
+    parser.add_argument("--persons", type=int, default=60, help="Antall syntetiske personer")
+    parser.add_argument("--latency", type=float, default=20.0, help="Forsinkelse per kall (millisekunder)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Andel kall som får 503 (0–1)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Sendes videre til skriptene")
+    parser.add_argument("--prefetch", type=int, default=2, help="Sider som hentes på forhånd (sendes videre)")
+    parser.add_argument("--rate", type=float, help="Startrate for skriptenes rate-begrensning (standard: skriptenes egen)")
+    parser.add_argument("--max-rate", type=float, help="Øvre rate for skriptenes rate-begrensning")
+    parser.add_argument("--start", type=int, default=2018)
+    parser.add_argument("--end", type=int, default=2024)
+    parser.add_argument("--json", help="Skriv resultatene som JSON til denne filen")
+    args = parser.parse_args()
+
+    fixtures = mock_cristin_server.lag_fixtures(args.results, args.persons)
+    mock = mock_cristin_server.MockCristin(fixtures, args.latency / 1000, args.error_rate)
+    server = mock_cristin_server.start_server(mock)
+    base = f"http://127.0.0.1:{server.server_port}/v2"
+
+    resultater = []
+    with tempfile.TemporaryDirectory(prefix="pycristin_bench_") as arbeidskatalog:
+        with open(os.path.join(arbeidskatalog, "cristin_ids.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(fixtures["personer"]) + "\n")
+
+        for navn, kommando in scenarier(args).items():
+            if args.scenario and navn not in args.scenario:
+                continue
+            print(f"⏱️  Kjører {navn} ...")
+            resultat = kjor_scenario(navn, kommando, mock, base, arbeidskatalog)
+            if resultat["exit_code"] != 0:
+                with open(os.path.join(arbeidskatalog, f"{navn}.log"), encoding="utf-8") as logg:
+                    print(logg.read()[-2000:])
+            resultater.append(resultat)
+
+    server.shutdown()
+
+    print(f"\n{'Scenario':<10} {'Req':>7} {'Req/s':>8} {'Tid (s)':>9} {'Minne (MB)':>11} {'503':>5}")
+    for r in resultater:
+        print(f"{r['scenario']:<10} {r['requests']:>7} {r['requests_per_sec']:>8} {r['wall_time_s']:>9} "
+              f"{r['peak_memory_mb']:>11} {r['injected_503']:>5}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parametre": vars(args), "resultater": resultater}, f, ensure_ascii=False, indent=2)
+        print(f"✅ Lagret til {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# === KONFIG ===
+STANDARD_CACHE_DIR = ".cristin_cache"
+STANDARD_MAKS_MB = 500
+STANDARD_MINNE_MB = 64
+
+DAG = 24 * 3600
+
+# Levetid per endepunktklasse. Etter utløp revalideres svaret med ETag/Last-Modified.
+TTL = {
+    "results": 14 * DAG,
+    "contributors": 14 * DAG,
+    "units": 30 * DAG,
+    "institutions": 30 * DAG,
+    "persons": 30 * DAG,
+    "listing": DAG // 2,
+    "annet": DAG,
+}
+
+_ENDEPUNKTER = [
+    (re.compile(r"/results/[^/]+/contributors/?$"), "contributors"),
+    (re.compile(r"/(units|persons)/[^/]+/results/?$"), "listing"),
+    (re.compile(r"/results/[^/]+/?$"), "results"),
+    (re.compile(r"/units/[^/]+/?$"), "units"),
+    (re.compile(r"/institutions/[^/]+/?$"), "institutions"),
+    (re.compile(r"/persons/[^/]+/?$"), "persons"),
+]
+
+# Enkeltobjekter som ofte hentes flere ganger i samme kjøring og holdes i minnecachen (ikke listesider)
+MINNE_KLASSER = {"results", "contributors", "units", "institutions", "persons"}
+
+# Hop-by-hop og kodingsheadere gjelder ikke det lagrede (dekodede) innholdet
+_UTELATTE_HEADERE = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+def endepunktklasse(url):
+    sti = url.split("?", 1)[0]
+    for monster, klasse in _ENDEPUNKTER:
+        if monster.search(sti):
+            return klasse
+    return "annet"
+
+
+def lag_nokkel(url, params=None):
+    if not params:
+        return url
+    skille = "&" if "?" in url else "?"
+    return f"{url}{skille}{urlencode(sorted(params.items()))}"
+
+
+class ResponsCache:
+    def __init__(self, katalog=STANDARD_CACHE_DIR, maks_mb=STANDARD_MAKS_MB):
+        os.makedirs(katalog, exist_ok=True)
+        self.maks_storrelse = int(maks_mb * 1024 * 1024)
+        self._lås = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(katalog, "responser.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS svar (
+                nokkel TEXT PRIMARY KEY,
+                klasse TEXT NOT NULL,
+                headere TEXT NOT NULL,
+                innhold BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                lagret REAL NOT NULL,
+                brukt REAL NOT NULL,
+                storrelse INTEGER NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS svar_brukt ON svar (brukt)")
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(storrelse), 0) FROM svar").fetchone()[0]
+        self.treff = 0
+        self.revalidert = 0
+        self.bom = 0
+
+    def slaa_opp(self, nokkel):
+        with self._lås:
+            rad = self._db.execute(
+                "SELECT klasse, headere, innhold, etag, last_modified, lagret FROM svar WHERE nokkel = ?",
+                (nokkel,),
+            ).fetchone()
+            if rad is None:
+                return None
+            self._db.execute("UPDATE svar SET brukt = ? WHERE nokkel = ?", (time.time(), nokkel))
+            self._db.commit()
+        klasse, headere, innhold, etag, last_modified, lagret = rad
+        return {
+            "klasse": klasse,
+            "headere": json.loads(headere),
+            "innhold": innhold,
+            "etag": etag,
+            "last_modified": last_modified,
+            "lagret": lagret,
+        }
+
+    def er_fersk(self, oppføring):
+        return time.time() - oppføring["lagret"] < TTL.get(oppføring["klasse"], TTL["annet"])
+
+    def validatorer(self, oppføring):
+        headere = {}
+        if oppføring["etag"]:
+            headere["If-None-Match"] = oppføring["etag"]
+        if oppføring["last_modified"]:
+            headere["If-Modified-Since"] = oppføring["last_modified"]
+        return headere
+
+    def lagre(self, nokkel, url, resp):
+        headere = {k: v for k, v in resp.headers.items() if k.lower() not in _UTELATTE_HEADERE}
+        innhold = resp.content
+        nå = time.time()
+        with self._lås:
+            gammel = self._db.execute("SELECT storrelse FROM svar WHERE nokkel = ?", (nokkel,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO svar VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (nokkel, endepunktklasse(url), json.dumps(headere), innhold,
+                 resp.headers.get("ETag"), resp.headers.get("Last-Modified"), nå, nå, len(innhold)),
+            )
+            self._total += len(innhold) - (gammel[0] if gammel else 0)
+            if self._total > self.maks_storrelse:
+                self._kast_ut()
+            self._db.commit()
+
+    def forny(self, nokkel):
+        with self._lås:
+            nå = time.time()
+            self._db.execute("UPDATE svar SET lagret = ?, brukt = ? WHERE nokkel = ?", (nå, nå, nokkel))
+            self._db.commit()
+
+    def _kast_ut(self):
+        # Fjern minst nylig brukte svar til vi er godt under grensen
+        mål = int(self.maks_storrelse * 0.9)
+        for nokkel, storrelse in self._db.execute("SELECT nokkel, storrelse FROM svar ORDER BY brukt").fetchall():
+            if self._total <= mål:
+                break
+            self._db.execute("DELETE FROM svar WHERE nokkel = ?", (nokkel,))
+            self._total -= storrelse
+
+    def lukk(self):
+        with self._lås:
+            self._db.close()
+
+
+def til_respons(url, oppføring):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = oppføring["innhold"]
+    resp.headers = CaseInsensitiveDict(oppføring["headere"])
+    resp.url = url
+    resp.encoding = "utf-8"
+    return resp
+
+
+class Minnecache:
+    # LRU i minnet for enkeltobjekter innenfor én prosess, foran den lagrede cachen. Begrenset av antall bytes
+    # innhold; de minst nylig brukte svarene kastes ut først.
+    def __init__(self, maks_mb=STANDARD_MINNE_MB):
+        self.maks_storrelse = maks_mb * 1024 * 1024
+        self._svar = OrderedDict()
+        self._storrelse = 0
+        self._lås = threading.Lock()
+        self.treff = 0
+
+    def slaa_opp(self, nokkel):
+        with self._lås:
+            oppføring = self._svar.get(nokkel)
+            if oppføring is not None:
+                self._svar.move_to_end(nokkel)
+                self.treff += 1
+            return oppføring
+
+    def lagre(self, nokkel, url, resp):
+        if resp.status_code != 200 or endepunktklasse(url) not in MINNE_KLASSER:
+            return
+        innhold = resp.content
+        if len(innhold) > self.maks_storrelse:
+            return
+        headere = {k: v for k, v in resp.headers.items() if k.lower() not in _UTELATTE_HEADERE}
+        with self._lås:
+            gammel = self._svar.pop(nokkel, None)
+            if gammel is not None:
+                self._storrelse -= len(gammel["innhold"])
+            self._svar[nokkel] = {"innhold": innhold, "headere": headere}
+            self._storrelse += len(innhold)
+            while self._storrelse > self.maks_storrelse:
+                _, kastet = self._svar.popitem(last=False)
+                self._storrelse -= len(kastet["innhold"])
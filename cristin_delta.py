@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from cristin_skrivere import skriv_rader
+
+# Deltahøsting. Et øyeblikksbilde husker hvert resultat fra forrige vellykkede kjøring med endringsstempel
+# (last_modified, eller en hash av listeposten når den mangler) og radene det ga. Listene hentes som før,
+# men resultater med uendret stempel gjenbruker radene sine, så detalj- og bidragsyterkall bare gjøres for
+# nye og endrede resultater. Til slutt skrives en endringsfil (added/modified/removed) og nytt bilde.
+#
+# Bildet gjelder ett omfang (units/år/modus); et bilde fra et annet omfang brukes ikke.
+
+ENDRINGSKOLONNE = "Endring"
+
+
+class Oyeblikksbilde:
+    def __init__(self, filnavn, omfang):
+        self.filnavn = filnavn
+        self.omfang = omfang
+        self.tatt = None
+        self.forrige = {}
+        self.nye = {}
+        self.endringer = {}
+        self.gjenbrukt = 0
+        self._lås = threading.Lock()
+
+        if os.path.exists(filnavn):
+            with gzip.open(filnavn, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("omfang") == omfang:
+                self.tatt = data["tatt"]
+                self.forrige = data["poster"]
+            else:
+                print(f"⚠️  '{filnavn}' er fra et annet omfang ({data.get('omfang')}) – henter alt på nytt")
+
+    def gjenbruk(self, nokkel, endret):
+        # Radene fra forrige kjøring når resultatet er uendret, ellers None
+        gammel = self.forrige.get(nokkel)
+        if gammel is None or endret is None or gammel[0] != endret:
+            return None
+        with self._lås:
+            self.nye[nokkel] = gammel
+            self.gjenbrukt += 1
+        return gammel[1]
+
+    def registrer(self, nokkel, endret, rader):
+        # endret=None: ukjent stempel (f.eks. rader fra journalen); regnes ikke som endring
+        gammel = self.forrige.get(nokkel)
+        with self._lås:
+            self.nye[nokkel] = [endret if endret is not None or gammel is None else gammel[0], rader]
+            if gammel is None:
+                self.endringer[nokkel] = "added"
+            elif endret is not None and gammel[0] != endret:
+                self.endringer[nokkel] = "modified"
+
+    def endringsrader(self, omfattet=None):
+        # Nøkler fra forrige bilde som ikke ble sett er fjernet. Med omfattet (predikat) gjelder det bare
+        # nøkler som hørte til denne kjøringen; de andre tas uendret med videre i bildet.
+        for nokkel, gammel in self.forrige.items():
+            if nokkel in self.nye:
+                continue
+            if omfattet is None or omfattet(nokkel):
+                self.endringer[nokkel] = "removed"
+            else:
+                self.nye[nokkel] = gammel
+        for nokkel, endring in self.endringer.items():
+            rader = (self.forrige if endring == "removed" else self.nye)[nokkel][1]
+            for rad in rader:
+                yield {ENDRINGSKOLONNE: endring, **rad}
+
+    def lagre(self):
+        tmp = f"{self.filnavn}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"tatt": datetime.now(timezone.utc).isoformat(timespec="seconds"), "omfang": self.omfang,
+                       "poster": self.nye}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.filnavn)
+
+
+# === Delt bilde for høsteskriptene (no-op når deltamodus ikke er aktivert)
+_bilde = None
+
+
+def aktiver(filnavn, omfang):
+    global _bilde
+    _bilde = Oyeblikksbilde(filnavn, omfang) if filnavn else None
+    if _bilde is not None and _bilde.tatt:
+        print(f"🔂 Deltamodus: {len(_bilde.forrige)} resultater fra kjøringen {_bilde.tatt}")
+
+
+def gjenbruk(nokkel, endret):
+    return _bilde.gjenbruk(nokkel, endret) if _bilde is not None else None
+
+
+def registrer(nokkel, endret, rader):
+    if _bilde is not None:
+        _bilde.registrer(nokkel, endret, rader)
+
+
+def avslutt(endringsfil, kolonner=None, feilet=False, omfattet=None):
+    # Ved feilede kall mangler det rader, og de ville sett ut som fjernet; da beholdes forrige bilde
+    global _bilde
+    if _bilde is None:
+        return
+    bilde, _bilde = _bilde, None
+    if feilet:
+        print(f"⚠️  Kall feilet – '{bilde.filnavn}' oppdateres ikke, og ingen endringsfil skrives")
+        return
+    antall = skriv_rader(bilde.endringsrader(omfattet), endringsfil, "csv",
+                         [ENDRINGSKOLONNE] + kolonner if kolonner else None)
+    teller = {e: list(bilde.endringer.values()).count(e) for e in ("added", "modified", "removed")}
+    print(f"🔂 Endringer: {teller['added']} nye, {teller['modified']} endrede, {teller['removed']} fjernede "
+          f"({antall} rader i {endringsfil}); {bilde.gjenbrukt} uendrede gjenbrukt")
+    bilde.lagre()
+
+
+def sjekk_argumenter(parser, args):
+    # Gjenbrukte rader er bare CSV-radene, ikke postene kolonnelageret trenger (bidragsytere, affiliasjoner),
+    # så en deltakjøring ville gitt et lager der de uendrede resultatene mangler
+    if args.delta and args.store:
+        parser.error("--delta kan ikke kombineres med --store")
+
+
+def legg_til_deltaargumenter(parser, standard):
+    # Uten filnavn blir args.delta True, og skriptet bruker standardnavnet sitt
+    parser.add_argument("--delta", nargs="?", const=True, metavar="SNAPSHOT",
+                        help=f"Hent bare nye og endrede resultater siden forrige kjøring (standard: {standard})")
+    parser.add_argument("--changes", metavar="FILE",
+                        help="Endringsfil (CSV) for --delta (standard: endringer_<tidspunkt>.csv)")
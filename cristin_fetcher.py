@@ -1,162 +1,184 @@
-import requests
-import csv
-
-# === KONFIG ===
+import argparse
+import hashlib
+import threading
+from collections import Counter
+from datetime import datetime
+
+import cristin_delta as delta
+import cristin_klient
+import cristin_kolonnelager as kolonnelager
+import cristin_poster as poster
+import cristin_statistikk as statistikk
+from cristin_journal import Journal
+from cristin_parallell import kjor_parallelt
+from cristin_planlegger import BULK_PARAMS, BULK_PER_PAGE, skriv_oppsummering, trenger_detaljer
+from cristin_skrivere import skriv_rader
+
+# === KONFIG (standardverdier, kan overstyres med argumenter) ===
 START_YEAR = 2018
 END_YEAR = 2024
 CRISTIN_ID_FIL = "cristin_ids.txt"
 OUTPUT_FILE = "cristin_publikasjoner_kategoriadaptiv.csv"
-CRISTIN_API_BASE = "https://api.cristin.no/v2"
+SNAPSHOT_FILE = "snapshot_personer.json.gz"
+KOLONNER = ["Cristin-ID", "Navn", "Tittel", "År", "Kategori", "Publiseringssted / Kanal", "Media type", "NVI-nivå",
+            "Resultat-URL", "Cristin Resultat-ID", "Kanal-kilde (debug)"]
+CRISTIN_API_BASE = cristin_klient.CRISTIN_API_BASE
 
 def hent_navn_fra_api(cristin_id):
     url = f"{CRISTIN_API_BASE}/persons/{cristin_id}"
-    response = requests.get(url)
+    response = cristin_klient.hent(url)
     if response.status_code != 200:
         print(f"⚠️  Klarte ikke hente navn for {cristin_id} ({response.status_code})")
         return "Ukjent navn"
-    data = response.json()
+    data = poster.les_json(response)
     return f"{data.get('first_name', '')} {data.get('surname', '')}".strip()
 
-def bestem_publiseringssted(pub, kategori):
-    kanal = ""
-    kilde = ""
-
-    # === 1: Journal
-    journal = pub.get("journal")
-    if isinstance(journal, dict) and isinstance(journal.get("name"), str):
-        kanal = journal["name"]
-        kilde = "journal.name"
-
-    # === 2: Publisher
-    if not kanal and isinstance(pub.get("publisher"), dict):
-        kanal = pub["publisher"].get("name", "")
-        if kanal:
-            kilde = "publisher.name"
-
-    # === 3: Lecture / Academic lecture – organiser/event
-    if not kanal and kategori.lower() in ["lecture", "academic lecture"]:
-        kanal = pub.get("organiser", "")
-        if kanal:
-            kilde = "organiser"
-        elif pub.get("event", {}).get("arranged_by", {}).get("name"):
-            kanal = pub["event"]["arranged_by"]["name"]
-            kilde = "event.arranged_by.name"
-        elif pub.get("event", {}).get("name") and pub.get("event", {}).get("location"):
-            kanal = f"{pub['event']['name']} – {pub['event']['location']}"
-            kilde = "event.name + location"
-        elif pub.get("event", {}).get("name"):
-            kanal = pub["event"]["name"]
-            kilde = "event.name"
-
-    # === 4: Doctoral dissertation – series
-    if not kanal and kategori.lower() == "doctoral dissertation":
-        kanal = pub.get("series", {}).get("name", "")
-        if kanal:
-            kilde = "series.name"
-
-    # === 5: place
-    if not kanal and pub.get("place"):
-        kanal = pub["place"]
-        kilde = "place"
-
-    # === 6: media_type
-    if not kanal and pub.get("media_type", {}).get("code_name", {}).get("en"):
-        kanal = pub["media_type"]["code_name"]["en"]
-        kilde = "media_type.code_name"
-
-    # === 7: channel.title
-    if not kanal and pub.get("channel", {}).get("title"):
-        kanal = pub["channel"]["title"]
-        kilde = "channel.title"
-
-    if not kanal:
-        kanal = "Ukjent"
-        kilde = "Ingen relevante felter funnet"
-
-    return kanal, kilde
-
-def hent_publikasjoner(cristin_id, navn):
+# Resultater deles mellom personene i kjøringen: hvert cristin_result_id hentes og tolkes én gang
+_resultatlager = {}
+_lager_lås = threading.Lock()
+lager_teller = Counter()
+
+def lag_rad(post, cristin_id, navn):
+    resultat_id = post.resultat_id
+    # I deltamodus gjenbrukes raden når resultatet er uendret siden forrige kjøring
+    nokkel = f"{cristin_id}:{resultat_id}"
+    forrige = delta.gjenbruk(nokkel, post.endret)
+    if forrige:
+        return {**forrige[0], "Navn": navn}
+    with _lager_lås:
+        lager_teller["oppslag"] += 1
+        felles = _resultatlager.get(resultat_id) if resultat_id else None
+    if felles is None:
+        with statistikk.fase("tolking"):
+            felles = lag_felles(post)
+        if resultat_id:
+            with _lager_lås:
+                _resultatlager[resultat_id] = felles
+    rad = {"Cristin-ID": cristin_id, "Navn": navn, **felles}
+    kolonnelager.legg_til("results", poster.lagerrad(post, nvi_niva=rad["NVI-nivå"], person_id=cristin_id,
+                                                     person_navn=navn))
+    delta.registrer(nokkel, post.endret, [rad])
+    return rad
+
+def lag_felles(post):
+    # Hent nvi_level fra listeposten, eller fra detaljvisning når listen mangler det
+    nvi = post.nvi
+    if post.resultat_id and trenger_detaljer(post):
+        nvi = "-"
+        resurl = f"{CRISTIN_API_BASE}/results/{post.resultat_id}"
+        resresp = cristin_klient.hent(resurl)
+        if resresp.status_code == 200:
+            nvi = poster.tolk_resultat(poster.les_json(resresp)).nvi
+
+    return {
+        "Tittel": post.tittel,
+        "År": post.aar,
+        "Kategori": post.kategori,
+        "Publiseringssted / Kanal": post.publiseringssted,
+        "Media type": post.media_type,
+        "NVI-nivå": nvi,
+        "Resultat-URL": post.url,
+        "Cristin Resultat-ID": post.resultat_id if post.resultat_id is not None else "",
+        "Kanal-kilde (debug)": post.kanal_kilde  # Valgfritt – fjern om du vil
+    }
+
+def hent_publikasjoner(cristin_id, navn, samtidighet=1, startaar=START_YEAR, sluttaar=END_YEAR):
     url = f"{CRISTIN_API_BASE}/persons/{cristin_id}/results"
-    response = requests.get(url)
+    params = {**BULK_PARAMS, "per_page": BULK_PER_PAGE}
+    response = cristin_klient.hent(url, params=params)
     if response.status_code != 200:
         print(f"❌ Feil ved henting av resultater for {cristin_id}: {response.status_code}")
+        if response.status_code not in cristin_klient.RETRY_STATUS:
+            cristin_klient.registrer_feil(url, params, f"HTTP {response.status_code}")
         return []
 
-    publikasjoner = response.json()
-    resultatliste = []
-
-    for pub in publikasjoner:
+    utvalgte = []
+    for pub in poster.les_json(response):
         try:
             år = int(pub.get("year_published", 0))
         except (ValueError, TypeError):
             continue
 
-        if START_YEAR <= år <= END_YEAR:
-            tittel = pub.get("title", {}).get(pub.get("original_language", ""), "(Uten tittel)")
-            kategori = pub.get("category", {}).get("name", {}).get("en", "")
-            # Hent nvi_level fra detaljvisning
-            nvi = "-"
-            resultat_id = pub.get("cristin_result_id")
-            if resultat_id:
-                resurl = f"{CRISTIN_API_BASE}/results/{resultat_id}"
-                resresp = requests.get(resurl)
-                if resresp.status_code == 200:
-                    resdata = resresp.json()
-                    journal = resdata.get("journal", {})
-                    if isinstance(journal, dict):
-                        nvi = journal.get("nvi_level") or journal.get("publisher", {}).get("nvi_level") or "-"
-
-            publiseringssted, kanal_kilde = bestem_publiseringssted(pub, kategori)
-
-            # Media type
-            media_type = ""
-            if isinstance(pub.get("media_type"), dict):
-                media_type = pub["media_type"].get("code_name", {}).get("en", "")
-            elif isinstance(pub.get("media_type"), str):
-                media_type = pub["media_type"]
-
-            resultatliste.append({
-                "Cristin-ID": cristin_id,
-                "Navn": navn,
-                "Tittel": tittel,
-                "År": år,
-                "Kategori": kategori,
-                "Publiseringssted / Kanal": publiseringssted,
-                "Media type": media_type,
-                "NVI-nivå": nvi,
-                "Resultat-URL": pub.get("url", ""),
-                "Cristin Resultat-ID": pub.get("cristin_result_id", ""),
-                "Kanal-kilde (debug)": kanal_kilde  # Valgfritt – fjern om du vil
-            })
-
-    return resultatliste
+        if startaar <= år <= sluttaar:
+            utvalgte.append(poster.tolk_resultat(pub, år))
+
+    # Detaljkallene for NVI-nivå går parallelt, rekkefølgen beholdes
+    return kjor_parallelt(lambda post: lag_rad(post, cristin_id, navn), utvalgte, samtidighet)
 
 def les_cristin_ids(filnavn):
     with open(filnavn, "r", encoding="utf-8") as f:
         return [linje.strip() for linje in f if linje.strip()]
 
 def lagre_csv(publikasjoner, filnavn):
-    if not publikasjoner:
+    # Radene skrives fortløpende, så ingenting må samles i minnet først
+    antall = skriv_rader(publikasjoner, filnavn)
+    if not antall:
         print("Ingen publikasjoner funnet.")
         return
-    with open(filnavn, "w", newline="", encoding="utf-8") as csvfile:
-        feltnavn = publikasjoner[0].keys()
-        writer = csv.DictWriter(csvfile, fieldnames=feltnavn)
-        writer.writeheader()
-        writer.writerows(publikasjoner)
-    print(f"✅ {len(publikasjoner)} resultater lagret i '{filnavn}'.")
-
-def main():
-    cristin_ids = les_cristin_ids(CRISTIN_ID_FIL)
-    alle_publikasjoner = []
+    print(f"✅ {antall} resultater lagret i '{filnavn}'.")
 
+def hent_alle_publikasjoner(cristin_ids, journal, samtidighet=1, startaar=START_YEAR, sluttaar=END_YEAR):
+    # Personer som allerede er ferdige i journalen hoppes over
+    gjenstaende = [cristin_id for cristin_id in cristin_ids if not journal.er_ferdig(cristin_id)]
+    navneliste = dict(zip(gjenstaende, kjor_parallelt(hent_navn_fra_api, gjenstaende, samtidighet)))
     for cristin_id in cristin_ids:
-        navn = hent_navn_fra_api(cristin_id)
+        if journal.er_ferdig(cristin_id):
+            for rad in journal.rader(cristin_id):
+                delta.registrer(f"{cristin_id}:{rad['Cristin Resultat-ID']}", None, [rad])
+                yield rad
+            continue
+        navn = navneliste[cristin_id]
         print(f"Henter data for Cristin-ID: {cristin_id} ({navn}) ...")
-        pubs = hent_publikasjoner(cristin_id, navn)
-        alle_publikasjoner.extend(pubs)
-
-    lagre_csv(alle_publikasjoner, OUTPUT_FILE)
+        pubs = hent_publikasjoner(cristin_id, navn, samtidighet, startaar, sluttaar)
+        journal.registrer(cristin_id, pubs)
+        yield from pubs
+
+def journalfil(cristin_ids, startaar, sluttaar):
+    # Journalen gjelder én ID-liste og ett årsintervall; et gjenopptak med andre --ids/--start/--end
+    # skal ikke gjenbruke personer som ble høstet for et annet utvalg
+    utvalg = hashlib.sha1(" ".join(cristin_ids).encode()).hexdigest()[:12]
+    return f".journal_personer_{utvalg}_{startaar}_{sluttaar}.jsonl"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hent Cristin-publikasjoner for en liste personer.")
+    parser.add_argument("--ids", default=CRISTIN_ID_FIL,
+                        help=f"Fil med én Cristin person-ID per linje (standard: {CRISTIN_ID_FIL})")
+    parser.add_argument("--start", type=int, default=START_YEAR, help="Startår")
+    parser.add_argument("--end", type=int, default=END_YEAR, help="Sluttår")
+    parser.add_argument("--output", default=OUTPUT_FILE, help=f"CSV-fil (standard: {OUTPUT_FILE})")
+    parser.add_argument("--resume", action="store_true", help="Fortsett en avbrutt kjøring fra journalen")
+    parser.add_argument("--journal", help="Journalfil for sjekkpunkter per person (standard avledes fra ID-er og år)")
+    kolonnelager.legg_til_lagerargumenter(parser)
+    delta.legg_til_deltaargumenter(parser, SNAPSHOT_FILE)
+    statistikk.legg_til_statistikkargument(parser)
+    cristin_klient.legg_til_http_argumenter(parser)
+    args = parser.parse_args(argv)
+    delta.sjekk_argumenter(parser, args)
+    cristin_klient.konfigurer_fra_args(args)
+    kolonnelager.aktiver(args.store, "persons")
+    # Bildet dekker alle personer som er høstet med samme årsintervall; personer som ikke er med i
+    # denne kjøringen, regnes ikke som fjernet
+    delta.aktiver(SNAPSHOT_FILE if args.delta is True else args.delta, {"start": args.start, "end": args.end})
+
+    cristin_ids = les_cristin_ids(args.ids)
+    personer = set(cristin_ids)
+    journal = Journal(args.journal or journalfil(cristin_ids, args.start, args.end), gjenoppta=args.resume)
+
+    lagre_csv(hent_alle_publikasjoner(cristin_ids, journal, cristin_klient.samtidighet, args.start, args.end),
+              args.output)
+    skriv_oppsummering()
+    delta.avslutt(args.changes or f"endringer_personer_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", KOLONNER,
+                  feilet=bool(cristin_klient.feilede_forespørsler),
+                  omfattet=lambda nokkel: nokkel.split(":")[0] in personer)
+    if lager_teller["oppslag"]:
+        print(f"🔁 Resultatlager: {lager_teller['oppslag']} person–resultat-par, {len(_resultatlager)} unike resultater "
+              f"(dedup-faktor {lager_teller['oppslag'] / max(len(_resultatlager), 1):.2f})")
+    kolonnelager.avslutt()
+    # Ved feilede kall beholdes journalen, slik at kjøringen kan gjenopptas med --resume
+    journal.avslutt(slett=not cristin_klient.feilede_forespørsler)
+    statistikk.skriv_rapport(args.stats_file, resultatlager={"person_resultat_par": lager_teller["oppslag"],
+                                                             "unike_resultater": len(_resultatlager)})
+    cristin_klient.avslutt()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    # Append-only sjekkpunktfil: én JSON-linje per ferdig arbeidsenhet (resultat, side eller person) med radene den ga.
+    # Ved --resume leses fullførte enheter inn igjen, og en halvskrevet siste linje kuttes bort.
+    def __init__(self, filnavn, gjenoppta=False):
+        self.filnavn = filnavn
+        self.ferdige = {}
+        gyldig_lengde = 0
+
+        if gjenoppta and os.path.exists(filnavn):
+            with open(filnavn, "rb") as f:
+                for linje in f:
+                    try:
+                        post = json.loads(linje)
+                    except ValueError:
+                        break
+                    self.ferdige[str(post["nokkel"])] = post["rader"]
+                    gyldig_lengde += len(linje)
+            with open(filnavn, "r+b") as f:
+                f.truncate(gyldig_lengde)
+            if self.ferdige:
+                print(f"↩️  Gjenopptar fra '{filnavn}': {len(self.ferdige)} enheter allerede ferdige")
+
+        self._fil = open(filnavn, "a" if gjenoppta else "w", encoding="utf-8")
+        self._lås = threading.Lock()
+
+    def er_ferdig(self, nokkel):
+        return str(nokkel) in self.ferdige
+
+    def rader(self, nokkel):
+        return self.ferdige[str(nokkel)]
+
+    def registrer(self, nokkel, rader, synk=True):
+        # Kan kalles fra flere tråder. Linjen skrives alltid ut av prosessen (overlever at den drepes);
+        # synk=False sparer fsync per linje, og neste fsync tar med alt som er skrevet før
+        linje = json.dumps({"nokkel": nokkel, "rader": rader}, ensure_ascii=False) + "\n"
+        with self._lås:
+            self._fil.write(linje)
+            self._fil.flush()
+            if synk:
+                os.fsync(self._fil.fileno())
+
+    def avslutt(self, slett=True):
+        # Journalen slettes når kjøringen er fullført og resultatet er lagret
+        self._fil.close()
+        if slett:
+            os.remove(self.filnavn)
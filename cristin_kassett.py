@@ -0,0 +1,92 @@
+import base64
+import gzip
+import json
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import cristin_cache
+
+# Kassett med opptak av API-svar. Med --record skrives hvert svar klienten gir fra seg (fra nett eller
+# cache) som én JSON-linje; med --replay lastes filen inn i minnet og svarene spilles av uten nett,
+# begrenser eller venting. Filer som slutter på .gz komprimeres. Samme nøkkel som cachen brukes, så
+# rekkefølgen på parametrene spiller ingen rolle.
+#
+#   {"k": "<url?params>", "s": 200, "h": {"X-Total-Count": "1500", ...}, "b": "<tekst>"}
+#
+# Innhold som ikke er gyldig UTF-8 lagres base64-kodet under "b64" i stedet for "b".
+
+STANDARD_KASSETT = "cristin_kassett.jsonl.gz"
+
+# Bare headerne skriptene faktisk leser tas med i opptaket
+_HEADERE = ("Content-Type", "X-Total-Count", "Link", "ETag", "Last-Modified")
+
+
+def _åpne(filnavn, modus):
+    if filnavn.endswith(".gz"):
+        return gzip.open(filnavn, modus + "t", encoding="utf-8")
+    return open(filnavn, modus, encoding="utf-8")
+
+
+class Opptak:
+    def __init__(self, filnavn):
+        self.filnavn = filnavn
+        # Tilføyes; en gzip-fil med flere ledd leses som én strøm
+        self._fil = _åpne(filnavn, "a")
+        self._lås = threading.Lock()
+        self.antall = 0
+
+    def skriv(self, nokkel, resp):
+        linje = {"k": nokkel, "s": resp.status_code,
+                 "h": {h: resp.headers[h] for h in _HEADERE if h in resp.headers}}
+        try:
+            linje["b"] = resp.content.decode("utf-8")
+        except UnicodeDecodeError:
+            linje["b64"] = base64.b64encode(resp.content).decode("ascii")
+        tekst = json.dumps(linje, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lås:
+            self._fil.write(tekst)
+            self.antall += 1
+
+    def lukk(self):
+        with self._lås:
+            self._fil.close()
+
+
+class Avspilling:
+    def __init__(self, filnavn):
+        self.filnavn = filnavn
+        self._svar = {}
+        with _åpne(filnavn, "r") as f:
+            for linje in f:
+                if not linje.strip():
+                    continue
+                post = json.loads(linje)
+                # Ved flere opptak av samme kall gjelder det siste
+                innhold = (post["b"].encode("utf-8") if "b" in post
+                           else base64.b64decode(post["b64"]))
+                self._svar[post["k"]] = (post["s"], post["h"], innhold)
+        self.treff = 0
+        self.bom = []
+
+    def __len__(self):
+        return len(self._svar)
+
+    def svar(self, url, params=None):
+        nokkel = cristin_cache.lag_nokkel(url, params)
+        opptak = self._svar.get(nokkel)
+        if opptak is None:
+            # Kallet finnes ikke i kassetten; gis som 404 slik at skriptene behandler det som et vanlig feilsvar
+            self.bom.append(nokkel)
+            status, headere, innhold = 404, {}, b""
+        else:
+            self.treff += 1
+            status, headere, innhold = opptak
+        resp = requests.Response()
+        resp.status_code = status
+        resp._content = innhold
+        resp.headers = CaseInsensitiveDict(headere)
+        resp.url = nokkel
+        resp.encoding = "utf-8"
+        return resp
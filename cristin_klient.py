@@ -0,0 +1,304 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+import cristin_cache
+import cristin_kassett
+import cristin_statistikk as statistikk
+from cristin_ratebegrenser import AdaptivBegrenser, START_RATE, MAKS_RATE, les_retry_after
+
+# === KONFIG ===
+# Kan overstyres, f.eks. mot mock_cristin_server.py ved testing og benchmarking
+CRISTIN_API_BASE = os.environ.get("CRISTIN_API_BASE", "https://api.cristin.no/v2").rstrip("/")
+POOL_STORRELSE = 10
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+MAKS_FORSØK = 6
+RETRY_STATUS = {429, 500, 502, 503, 504}
+FEILFIL = "feilede_forespørsler.json"
+
+_session = None
+_pool_storrelse = POOL_STORRELSE
+_timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+_cache = None
+_opptak = None
+_avspilling = None
+_minne = None
+_underveis = {}  # nøkkel -> Future for kall som hentes akkurat nå
+_underveis_lås = threading.Lock()
+_lås = threading.Lock()
+samtidighet = 1
+forhandshenting = 2  # Antall sider som kan ligge ferdig hentet foran den som behandles
+_begrenser = AdaptivBegrenser()
+_feilfil = FEILFIL
+feilede_forespørsler = []
+minne_teller = Counter()
+
+
+class HentingFeilet(Exception):
+    pass
+
+
+def konfigurer(pool_storrelse=POOL_STORRELSE, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+    global _session, _pool_storrelse, _timeout
+    if _session is not None:
+        _session.close()
+        _session = None
+    _pool_storrelse = pool_storrelse
+    _timeout = (connect_timeout, read_timeout)
+
+
+def hent_session():
+    # Én delt session med keep-alive, slik at TLS-tilkoblinger gjenbrukes mellom kall
+    global _session
+    with _lås:
+        if _session is None:
+            _session = _lag_session()
+    return _session
+
+
+def _lag_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=_pool_storrelse, pool_maxsize=_pool_storrelse)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+
+def konfigurer_cache(katalog=cristin_cache.STANDARD_CACHE_DIR, maks_mb=cristin_cache.STANDARD_MAKS_MB):
+    global _cache
+    if _cache is not None:
+        _cache.lukk()
+    _cache = cristin_cache.ResponsCache(katalog, maks_mb) if katalog else None
+
+
+def konfigurer_minne(maks_mb=cristin_cache.STANDARD_MINNE_MB):
+    global _minne
+    _minne = cristin_cache.Minnecache(maks_mb) if maks_mb else None
+
+
+def konfigurer_kassett(opptak=None, avspilling=None):
+    # Opptak og avspilling av alle svar, se cristin_kassett
+    global _opptak, _avspilling
+    if _opptak is not None:
+        _opptak.lukk()
+    _opptak = cristin_kassett.Opptak(opptak) if opptak else None
+    _avspilling = cristin_kassett.Avspilling(avspilling) if avspilling else None
+    if _avspilling is not None:
+        print(f"📼 Spiller av {len(_avspilling)} svar fra {avspilling} (ingen nettkall)")
+
+
+def konfigurer_rate(rate=START_RATE, maks_rate=MAKS_RATE):
+    global _begrenser
+    _begrenser = AdaptivBegrenser(rate=rate, maks_rate=max(rate, maks_rate))
+
+
+def _overforte_bytes(resp):
+    # Bytes over nettet (komprimert når API-et bruker gzip); innholdet leses først slik at tallet er komplett
+    innhold = resp.content
+    try:
+        return resp.raw.tell()
+    except (AttributeError, OSError):
+        return len(innhold)
+
+
+def _hent_fra_nett(url, params=None, headere=None):
+    with statistikk.nettkall():
+        return _hent_med_retry(url, params, headere)
+
+
+def _hent_med_retry(url, params=None, headere=None):
+    resp = None
+    for forsøk in range(MAKS_FORSØK):
+        _begrenser.vent()
+        start = time.monotonic()
+        try:
+            resp = hent_session().get(url, params=params, headers=headere, timeout=_timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _begrenser.registrer(time.monotonic() - start, ok=False)
+            statistikk.registrer(url, "feil")
+            feil = f"{type(e).__name__}: {e}"
+            resp = None
+        else:
+            latens = time.monotonic() - start
+            statistikk.registrer_kall(url, latens, resp.status_code, _overforte_bytes(resp))
+            if resp.status_code not in RETRY_STATUS:
+                _begrenser.registrer(latens, ok=True)
+                return resp
+            _begrenser.registrer(latens, ok=False)
+            feil = f"HTTP {resp.status_code}"
+
+        if forsøk == MAKS_FORSØK - 1:
+            break
+        statistikk.registrer(url, "retry")
+        retry_after = les_retry_after(resp.headers.get("Retry-After")) if resp is not None else None
+        if retry_after is not None:
+            print(f"⚠️  {feil} – API-et ber oss vente {retry_after:.0f} s (forsøk {forsøk + 1} av {MAKS_FORSØK})")
+            _begrenser.pause(retry_after)
+        else:
+            ventetid = _begrenser.backoff(forsøk)
+            print(f"⚠️  {feil} – ventet {ventetid:.1f} s før nytt forsøk ({forsøk + 1} av {MAKS_FORSØK})")
+
+    # Endelig feil: registreres i stedet for å forsvinne stille
+    registrer_feil(url, params, feil)
+    if resp is None:
+        raise HentingFeilet(f"{url}: {feil}")
+    return resp
+
+
+def registrer_feil(url, params, feil):
+    # Også for svar som ikke prøves på nytt, men som gjør at en liste blir ufullstendig (se cristin_paginering)
+    with _lås:
+        feilede_forespørsler.append({"url": url, "params": params, "feil": feil})
+
+
+def _kopi(resp):
+    # Eget svarobjekt til hver kaller som deler en henting
+    kopi = requests.Response()
+    kopi.status_code = resp.status_code
+    kopi._content = resp.content
+    kopi.headers = CaseInsensitiveDict(resp.headers)
+    kopi.url = resp.url
+    kopi.encoding = resp.encoding
+    return kopi
+
+
+def hent(url, params=None):
+    if _avspilling is not None:
+        return _avspilling.svar(url, params)
+
+    nokkel = cristin_cache.lag_nokkel(url, params)
+    if _minne is not None:
+        oppføring = _minne.slaa_opp(nokkel)
+        if oppføring is not None:
+            statistikk.registrer(url, "minnetreff")
+            return cristin_cache.til_respons(nokkel, oppføring)
+
+    # Samtidige kall til samme URL (f.eks. flere tråder som slår opp samme institusjon) deler én henting
+    with _underveis_lås:
+        underveis = _underveis.get(nokkel)
+        eier = underveis is None
+        if eier:
+            underveis = _underveis[nokkel] = Future()
+    if not eier:
+        statistikk.registrer(url, "sammenslått")
+        with _lås:
+            minne_teller["sammenslått"] += 1
+        return _kopi(underveis.result())
+
+    try:
+        resp = _hent_via_cache(url, params)
+        if _opptak is not None:
+            _opptak.skriv(nokkel, resp)
+        if _minne is not None:
+            _minne.lagre(nokkel, url, resp)
+        underveis.set_result(resp)
+        return resp
+    except BaseException as e:
+        underveis.set_exception(e)
+        raise
+    finally:
+        with _underveis_lås:
+            del _underveis[nokkel]
+
+
+def _hent_via_cache(url, params=None):
+    if _cache is None:
+        return _hent_fra_nett(url, params)
+
+    nokkel = cristin_cache.lag_nokkel(url, params)
+    oppføring = _cache.slaa_opp(nokkel)
+    if oppføring is not None and _cache.er_fersk(oppføring):
+        _cache.treff += 1
+        statistikk.registrer(url, "cache_treff")
+        return cristin_cache.til_respons(nokkel, oppføring)
+
+    headere = _cache.validatorer(oppføring) if oppføring is not None else {}
+    resp = _hent_fra_nett(url, params, headere)
+    if resp.status_code == 304 and oppføring is not None:
+        _cache.revalidert += 1
+        statistikk.registrer(url, "revalidert")
+        _cache.forny(nokkel)
+        return cristin_cache.til_respons(nokkel, oppføring)
+
+    _cache.bom += 1
+    if resp.status_code == 200:
+        _cache.lagre(nokkel, url, resp)
+    return resp
+
+
+def hent_betinget(url, params=None, etag=None):
+    # Betinget kall utenom cachen, for kallere som selv tar vare på ETag (f.eks. referanseindeksen).
+    # Ved avspilling gis det innspilte svaret, uten hensyn til ETag.
+    if _avspilling is not None:
+        return _avspilling.svar(url, params)
+    resp = _hent_fra_nett(url, params, {"If-None-Match": etag} if etag else None)
+    if _opptak is not None and resp.status_code != 304:
+        _opptak.skriv(cristin_cache.lag_nokkel(url, params), resp)
+    return resp
+
+
+def avslutt():
+    global _cache, _opptak
+    if feilede_forespørsler:
+        with open(_feilfil, "w", encoding="utf-8") as f:
+            json.dump(feilede_forespørsler, f, ensure_ascii=False, indent=2)
+        print(f"❌ {len(feilede_forespørsler)} forespørsler feilet etter {MAKS_FORSØK} forsøk – se '{_feilfil}'")
+    if _cache is not None:
+        print(f"🗄️  Cache: {_cache.treff} treff, {_cache.revalidert} revalidert, {_cache.bom} hentet fra API")
+        _cache.lukk()
+        _cache = None
+    if _minne is not None and (_minne.treff or minne_teller["sammenslått"]):
+        print(f"🧠 Minnecache: {_minne.treff} treff, {minne_teller['sammenslått']} samtidige kall slått sammen")
+    if _opptak is not None:
+        print(f"📼 {_opptak.antall} svar tatt opp i {_opptak.filnavn}")
+        _opptak.lukk()
+        _opptak = None
+    if _avspilling is not None and _avspilling.bom:
+        print(f"⚠️  {len(_avspilling.bom)} kall fantes ikke i {_avspilling.filnavn} og ble besvart med 404")
+
+
+def legg_til_http_argumenter(parser):
+    gruppe = parser.add_argument_group("HTTP")
+    gruppe.add_argument("--concurrency", type=int, default=1, help="Antall samtidige API-kall (1 = sekvensielt)")
+    gruppe.add_argument("--pool-size", type=int, default=POOL_STORRELSE, help="Antall gjenbrukte tilkoblinger i poolen")
+    gruppe.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT, help="Timeout for oppkobling (sekunder)")
+    gruppe.add_argument("--read-timeout", type=float, default=READ_TIMEOUT, help="Timeout for lesing av svar (sekunder)")
+    gruppe.add_argument("--rate", type=float, default=START_RATE, help="Startrate (forespørsler per sekund), justeres automatisk")
+    gruppe.add_argument("--max-rate", type=float, default=MAKS_RATE, help="Øvre grense for forespørsler per sekund")
+    gruppe.add_argument("--prefetch", type=int, default=forhandshenting, help="Antall sider som hentes på forhånd mens forrige side behandles (0 = av)")
+    gruppe.add_argument("--failed-file", default=FEILFIL, help="Fil for forespørsler som feilet etter alle forsøk")
+    gruppe.add_argument("--cache-dir", default=cristin_cache.STANDARD_CACHE_DIR, help="Katalog for lokal svar-cache")
+    gruppe.add_argument("--cache-max-mb", type=int, default=cristin_cache.STANDARD_MAKS_MB, help="Maks størrelse på cachen (MB)")
+    gruppe.add_argument("--no-cache", action="store_true", help="Ikke bruk lokal svar-cache")
+    gruppe.add_argument("--memory-cache-mb", type=int, default=cristin_cache.STANDARD_MINNE_MB,
+                        help="Størrelse på minnecachen for enkeltobjekter i kjøringen (MB, 0 = av)")
+    kassett = gruppe.add_mutually_exclusive_group()
+    kassett.add_argument("--record", metavar="FILE", nargs="?", const=cristin_kassett.STANDARD_KASSETT,
+                         help=f"Ta opp alle API-svar i en kassett (JSONL, .gz komprimeres; standard: {cristin_kassett.STANDARD_KASSETT})")
+    kassett.add_argument("--replay", metavar="FILE", nargs="?", const=cristin_kassett.STANDARD_KASSETT,
+                         help="Spill av API-svar fra en kassett i stedet for å kalle API-et")
+    return gruppe
+
+
+def konfigurer_fra_args(args):
+    global samtidighet, forhandshenting, _feilfil
+    samtidighet = max(1, args.concurrency)
+    forhandshenting = max(0, args.prefetch)
+    _feilfil = args.failed_file
+    konfigurer_rate(args.rate, args.max_rate)
+    konfigurer(max(args.pool_size, samtidighet + (1 if forhandshenting else 0)), args.connect_timeout, args.read_timeout)
+    konfigurer_cache(None if args.no_cache or args.replay else args.cache_dir, args.cache_max_mb)
+    konfigurer_minne(args.memory_cache_mb)
+    konfigurer_kassett(args.record, args.replay)
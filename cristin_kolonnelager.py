@@ -0,0 +1,203 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+
+# Lokalt kolonnelager (Parquet) for høstede data, slik at analyse og Excel-uttrekk kan kjøres uten nett.
+# Hver tabell er en katalog med part-filer; nye kjøringer legger til filer, og ved lesing vinner siste
+# høsting for hvert resultat. Krever pyarrow (pip install pyarrow), som bare importeres når lageret brukes.
+
+STANDARD_KATALOG = "cristin_lager"
+FLUSH_RADER = 5000
+
+_STRENG = "string"
+SKJEMA = {
+    "results": [
+        ("cristin_result_id", _STRENG), ("tittel", _STRENG), ("aar", "int32"), ("kategori", _STRENG),
+        ("kategori_kode", _STRENG), ("publiseringssted", _STRENG), ("kanal_kilde", _STRENG),
+        ("media_type", _STRENG), ("nvi_niva", _STRENG), ("url", _STRENG), ("unit_id", _STRENG),
+        ("person_id", _STRENG), ("person_navn", _STRENG), ("kilde", _STRENG), ("hentet", _STRENG),
+    ],
+    "contributors": [
+        ("cristin_result_id", _STRENG), ("rekkefolge", "int32"), ("cristin_person_id", _STRENG),
+        ("fornavn", _STRENG), ("etternavn", _STRENG), ("hentet", _STRENG),
+    ],
+    "affiliations": [
+        ("cristin_result_id", _STRENG), ("rekkefolge", "int32"), ("cristin_person_id", _STRENG),
+        ("unit_id", _STRENG), ("institution_id", _STRENG), ("hentet", _STRENG),
+    ],
+    "units": [
+        ("unit_id", _STRENG), ("landkode", _STRENG), ("institution_id", _STRENG), ("hentet", _STRENG),
+    ],
+    "institutions": [
+        ("institution_id", _STRENG), ("landkode", _STRENG), ("navn", _STRENG), ("hentet", _STRENG),
+    ],
+}
+
+# Hvilke kolonner som identifiserer en rad; ved lesing beholdes bare siste høsting per nøkkel
+NOKLER = {
+    "results": ["cristin_result_id", "unit_id", "person_id"],
+    "contributors": ["cristin_result_id"],
+    "affiliations": ["cristin_result_id"],
+    "units": ["unit_id"],
+    "institutions": ["institution_id"],
+}
+
+_skriver = None
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("❌ Kolonnelageret krever pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def _skjema(tabell):
+    pa = _pyarrow()
+    return pa.schema([(navn, pa.type_for_alias(type_)) for navn, type_ in SKJEMA[tabell]])
+
+
+class Lagerskriver:
+    def __init__(self, katalog=STANDARD_KATALOG, kilde=""):
+        _pyarrow()
+        self.katalog = katalog
+        self.kilde = kilde
+        self.hentet = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.antall = {tabell: 0 for tabell in SKJEMA}
+        self._buffer = {tabell: [] for tabell in SKJEMA}
+        self._lås = threading.Lock()
+        # Oppslagstabellene skrives én gang per nøkkel og kjøring, uansett hvor ofte de slås opp
+        self._oppslag = set()
+        # Units og institusjoner som affiliasjonene peker på, som (unit_id, unit_url, inst_id, inst_url)
+        self.referanser = set()
+
+    def legg_til(self, tabell, rad):
+        with self._lås:
+            if tabell == "results":
+                rad = {"kilde": self.kilde, **rad}
+            elif tabell in ("units", "institutions"):
+                nokkel = (tabell, rad[NOKLER[tabell][0]])
+                if nokkel in self._oppslag:
+                    return
+                self._oppslag.add(nokkel)
+            self._buffer[tabell].append({**rad, "hentet": self.hentet})
+            if len(self._buffer[tabell]) >= FLUSH_RADER:
+                self._skriv(tabell)
+
+    def _skriv(self, tabell):
+        rader = self._buffer[tabell]
+        if not rader:
+            return
+        pa = _pyarrow()
+        katalog = os.path.join(self.katalog, tabell)
+        os.makedirs(katalog, exist_ok=True)
+        skjema = _skjema(tabell)
+        data = pa.Table.from_pylist([{k: rad.get(k) for k in skjema.names} for rad in rader], schema=skjema)
+        filnavn = f"part-{self.hentet.replace(':', '')}-{uuid.uuid4().hex[:8]}.parquet"
+        pa.parquet.write_table(data, os.path.join(katalog, filnavn), compression="zstd")
+        self.antall[tabell] += len(rader)
+        self._buffer[tabell] = []
+
+    def lukk(self):
+        with self._lås:
+            for tabell in SKJEMA:
+                self._skriv(tabell)
+        skrevet = ", ".join(f"{tabell} {antall}" for tabell, antall in self.antall.items() if antall)
+        if skrevet:
+            print(f"🗃️  Kolonnelager '{self.katalog}': {skrevet} rader lagt til")
+
+
+# === Delt skriver for høsteskriptene (no-op når lageret ikke er aktivert)
+def aktiver(katalog, kilde):
+    global _skriver
+    _skriver = Lagerskriver(katalog, kilde) if katalog else None
+
+
+def er_aktiv():
+    return _skriver is not None
+
+
+def legg_til(tabell, rad):
+    if _skriver is not None:
+        _skriver.legg_til(tabell, rad)
+
+
+def legg_til_bidragsytere(resultat_id, bidragsytere):
+    # Bidragsytere og affiliasjoner (Bidragsyter-poster fra cristin_poster)
+    if _skriver is None:
+        return
+    for b in bidragsytere:
+        legg_til("contributors", {"cristin_result_id": resultat_id, "rekkefolge": b.rekkefolge,
+                                  "cristin_person_id": b.person_id, "fornavn": b.fornavn,
+                                  "etternavn": b.etternavn})
+        for a in b.affiliasjoner or ():
+            legg_til("affiliations", {"cristin_result_id": resultat_id, "rekkefolge": b.rekkefolge,
+                                      "cristin_person_id": b.person_id, "unit_id": a.unit_id,
+                                      "institution_id": a.inst_id})
+            _skriver.referanser.add((a.unit_id, a.unit_url, a.inst_id, a.inst_url))
+
+
+def affiliasjonsreferanser():
+    # Units og institusjoner i affiliasjonene som er lagt til så langt, som (unit_id, unit_url, inst_id, inst_url)
+    return list(_skriver.referanser) if _skriver is not None else []
+
+
+def avslutt():
+    global _skriver
+    if _skriver is not None:
+        _skriver.lukk()
+        _skriver = None
+
+
+def les_tabell(tabell, katalog=STANDARD_KATALOG, kolonner=None, filter=None):
+    # Leser en tabell med kolonneprojeksjon og predikat (pyarrow-uttrykk) skjøvet ned til Parquet-filene
+    pa = _pyarrow()
+    sti = os.path.join(katalog, tabell)
+    skjema = _skjema(tabell)
+    if not os.path.isdir(sti):
+        return skjema.empty_table().to_pandas()
+
+    nokler = NOKLER[tabell]
+    hentes = list(dict.fromkeys((kolonner or skjema.names) + nokler + ["hentet"]))
+    datasett = pa.dataset.dataset(sti, format="parquet", schema=skjema)
+    df = datasett.to_table(columns=hentes, filter=filter).to_pandas()
+
+    # Siste høsting vinner: behold bare radene fra nyeste 'hentet' per nøkkel. Med filter finnes nyeste
+    # 'hentet' fra nøkkelkolonnene uten filteret, ellers ville en nyere høsting som ikke lenger oppfyller
+    # filteret (f.eks. et rettet år) ikke fortrenge den gamle raden.
+    if len(df):
+        if filter is None:
+            nyeste = df.groupby(nokler, dropna=False)["hentet"].transform("max")
+        else:
+            alle = datasett.to_table(columns=nokler + ["hentet"]).to_pandas()
+            nyeste = df[nokler].merge(alle.groupby(nokler, dropna=False)["hentet"].max().reset_index(),
+                                      on=nokler, how="left")["hentet"].to_numpy()
+        df = df[df["hentet"] == nyeste].drop_duplicates()
+    return df[kolonner].reset_index(drop=True) if kolonner else df.reset_index(drop=True)
+
+
+def felt(navn):
+    return _pyarrow().dataset.field(navn)
+
+
+def aarsfilter(startaar=None, sluttaar=None):
+    uttrykk = None
+    if startaar is not None:
+        uttrykk = felt("aar") >= startaar
+    if sluttaar is not None:
+        slutt = felt("aar") <= sluttaar
+        uttrykk = slutt if uttrykk is None else uttrykk & slutt
+    return uttrykk
+
+
+def legg_til_lagerargumenter(parser, lese=False):
+    if lese:
+        parser.add_argument("--from-store", nargs="?", const=STANDARD_KATALOG, metavar="DIR",
+                            help=f"Les fra lokalt kolonnelager i stedet for API/CSV (standard: {STANDARD_KATALOG})")
+    else:
+        parser.add_argument("--store", nargs="?", const=STANDARD_KATALOG, metavar="DIR",
+                            help=f"Legg høstede data til lokalt kolonnelager (standard: {STANDARD_KATALOG})")
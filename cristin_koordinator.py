@@ -0,0 +1,407 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cristin_klient
+import cristin_referanse as referanse
+from cristin_planlegger import BULK_PER_PAGE
+
+# Deler en stor høsting i shards og kjører dem i flere prosesser, eller på flere maskiner via en felles
+# køkatalog (f.eks. på et delt filsystem). En shard er én unit i et årsintervall (eventuelt et sideintervall),
+# eller en gruppe personer. Arbeiderne tar en shard ved å flytte filen fra todo/ til running/ med os.rename,
+# som er atomisk, så to arbeidere aldri får samme shard. En shard som feiler legges tilbake i todo/ og prøves
+# på nytt (fra sin egen journal) inntil --max-attempts, deretter havner den i failed/.
+#
+#   python cristin_koordinator.py run --queue kø --unit 192.0.0.0 --subtree --years-per-shard 2 --workers 4
+#
+#   python cristin_koordinator.py plan --queue /delt/kø --unit 192.0.0.0 --subtree
+#   python cristin_koordinator.py work --queue /delt/kø --wait       # på hver maskin
+#   python cristin_koordinator.py merge --queue /delt/kø
+#
+# Køkatalogen: plan.json, todo/, running/, done/ (<shard>.jsonl med radene), failed/ og journal/.
+
+KATALOGER = ("todo", "running", "done", "failed", "journal")
+PERSONER_PER_SHARD = 25
+MAKS_FORSØK = 3
+VENTETID = 5  # Sekunder mellom hver titt i køen med --wait
+LIVSTEGN = 30  # Sekunder mellom hver oppdatering av claim-filen mens en shard kjører
+
+
+def _sti(katalog, *deler):
+    return os.path.join(katalog, *deler)
+
+
+def _skriv_json(filnavn, data):
+    # Atomisk: skriv til midlertidig fil og bytt ut
+    tmp = f"{filnavn}.tmp.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, filnavn)
+
+
+def _les_json(filnavn):
+    with open(filnavn, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def les_plan(katalog):
+    return _les_json(_sti(katalog, "plan.json"))
+
+
+def aarsintervaller(startaar, sluttaar, aar_per_shard):
+    # Synkende, som listene fra API-et, slik at sammenslått resultat får samme rekkefølge som én kjøring
+    if not aar_per_shard:
+        return [(startaar, sluttaar)]
+    return [(max(startaar, slutt - aar_per_shard + 1), slutt)
+            for slutt in range(sluttaar, startaar - 1, -aar_per_shard)]
+
+
+def antall_sider(unit_id, startaar, sluttaar):
+    # Ett lite kall med samme filter som høstingen; X-Total-Count gir antall sider
+    resp = cristin_klient.hent(f"{cristin_klient.CRISTIN_API_BASE}/units/{unit_id}/results",
+                               params={"per_page": 1, "published_since": startaar, "published_before": sluttaar + 1})
+    totalt = resp.headers.get("X-Total-Count", "")
+    if resp.status_code != 200 or not totalt.isdigit():
+        return None
+    return max(1, math.ceil(int(totalt) / BULK_PER_PAGE))
+
+
+def lag_unitshards(units, startaar, sluttaar, aar_per_shard=None, sider_per_shard=None, lite=False):
+    shards = []
+    for unit_id in units:
+        for fra, til in aarsintervaller(startaar, sluttaar, aar_per_shard):
+            grunn = {"type": "unit", "unit": unit_id, "start": fra, "end": til, "lite": lite}
+            sider = antall_sider(unit_id, fra, til) if sider_per_shard else None
+            if not sider:
+                shards.append({"id": f"unit_{unit_id}_{fra}-{til}", **grunn})
+                continue
+            # Siste shard for uniten har ingen øvre side og blar til en tom side, så resultater som er
+            # kommet til etter tellingen (X-Total-Count) ikke faller utenfor alle shardene
+            for forste in range(1, sider + 1, sider_per_shard):
+                siste = min(forste + sider_per_shard - 1, sider)
+                shards.append({"id": f"unit_{unit_id}_{fra}-{til}_p{forste:04d}-{siste:04d}", **grunn,
+                               "forste_side": forste, "siste_side": siste if siste < sider else None})
+    return shards
+
+
+def lag_personshards(cristin_ids, startaar, sluttaar, per_shard=PERSONER_PER_SHARD):
+    return [{"id": f"persons_{nr:04d}", "type": "persons", "ids": cristin_ids[i:i + per_shard],
+             "start": startaar, "end": sluttaar}
+            for nr, i in enumerate(range(0, len(cristin_ids), per_shard), start=1)]
+
+
+def planlegg(katalog, shards, type_):
+    if os.path.exists(_sti(katalog, "plan.json")):
+        raise SystemExit(f"❌ '{katalog}' har allerede en plan – bruk en ny katalog, eller 'work'/'merge' på denne")
+    for navn in KATALOGER:
+        os.makedirs(_sti(katalog, navn), exist_ok=True)
+    for shard in shards:
+        _skriv_json(_sti(katalog, "todo", f"{shard['id']}.json"), {**shard, "forsøk": 0, "feil": []})
+    # Planen skrives sist, så en katalog med plan.json alltid har alle shardene i todo/
+    _skriv_json(_sti(katalog, "plan.json"), {"type": type_, "shards": [s["id"] for s in shards],
+                                             "opprettet": datetime.now().isoformat(timespec="seconds")})
+    print(f"🗂️  {len(shards)} shards lagt i '{katalog}'")
+
+
+def ta_shard(katalog):
+    # Første ledige shard; rename feiler hvis en annen arbeider kom først, og da prøver vi neste
+    for navn in sorted(os.listdir(_sti(katalog, "todo"))):
+        if not navn.endswith(".json"):
+            continue
+        claim = _sti(katalog, "running", navn)
+        try:
+            os.rename(_sti(katalog, "todo", navn), claim)
+        except FileNotFoundError:
+            continue
+        os.utime(claim)
+        return claim
+    return None
+
+
+def frigi_foreldede(katalog, sekunder):
+    # Shards fra arbeidere som har dødd (claim-filen er ikke oppdatert på `sekunder`) legges tilbake i todo/
+    grense = time.time() - sekunder
+    for navn in os.listdir(_sti(katalog, "running")):
+        claim = _sti(katalog, "running", navn)
+        try:
+            if navn.endswith(".json") and os.path.getmtime(claim) < grense:
+                os.rename(claim, _sti(katalog, "todo", navn))
+                print(f"♻️  {navn[:-5]} var foreldet og er lagt tilbake i køen")
+        except FileNotFoundError:
+            continue
+
+
+def legg_tilbake_feilede(katalog):
+    # Shards som ga opp, får nye forsøk (f.eks. etter at API-et er tilbake)
+    antall = 0
+    for navn in os.listdir(_sti(katalog, "failed")):
+        if not navn.endswith(".json"):
+            continue
+        shard = _les_json(_sti(katalog, "failed", navn))
+        _skriv_json(_sti(katalog, "failed", navn), {**shard, "forsøk": 0})
+        os.rename(_sti(katalog, "failed", navn), _sti(katalog, "todo", navn))
+        antall += 1
+    print(f"♻️  {antall} feilede shards lagt tilbake i køen")
+
+
+def _shardrader(shard, journal):
+    import cristin_fetcher
+    import hent_unit_publikasjoner
+
+    if shard["type"] == "unit":
+        return hent_unit_publikasjoner.hent_publikasjoner_for_unit(
+            shard["unit"], shard["start"], shard["end"], lite=shard.get("lite", False),
+            samtidighet=cristin_klient.samtidighet, journal=journal,
+            forste_side=shard.get("forste_side", 1), siste_side=shard.get("siste_side"))
+    return cristin_fetcher.hent_alle_publikasjoner(shard["ids"], journal, cristin_klient.samtidighet,
+                                                   shard["start"], shard["end"])
+
+
+def kjor_shard(katalog, claim):
+    from cristin_journal import Journal
+
+    shard = _les_json(claim)
+    # Egen journal per shard: et nytt forsøk fortsetter der forrige stoppet
+    journal = Journal(_sti(katalog, "journal", f"{shard['id']}.jsonl"), gjenoppta=True)
+    ut = _sti(katalog, "done", f"{shard['id']}.jsonl")
+    tmp = f"{ut}.tmp.{os.getpid()}"
+    feil_før = len(cristin_klient.feilede_forespørsler)
+    try:
+        livstegn = time.monotonic()
+        antall = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rad in _shardrader(shard, journal):
+                f.write(json.dumps(rad, ensure_ascii=False) + "\n")
+                antall += 1
+                if time.monotonic() - livstegn > LIVSTEGN:
+                    os.utime(claim)
+                    livstegn = time.monotonic()
+        feilet = len(cristin_klient.feilede_forespørsler) - feil_før
+        if feilet:
+            raise cristin_klient.HentingFeilet(f"{feilet} kall feilet etter alle forsøk")
+    except Exception as e:
+        journal.avslutt(slett=False)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        shard["forsøk"] += 1
+        shard["feil"].append(f"{socket.gethostname()}: {type(e).__name__}: {e}")
+        mål = "failed" if shard["forsøk"] >= shard.get("maks_forsøk", MAKS_FORSØK) else "todo"
+        _skriv_json(claim, shard)
+        os.rename(claim, _sti(katalog, mål, os.path.basename(claim)))
+        print(f"❌ Shard {shard['id']} feilet (forsøk {shard['forsøk']}): {e}"
+              + (" – gir opp" if mål == "failed" else " – legges tilbake i køen"))
+        return False
+
+    os.replace(tmp, ut)
+    journal.avslutt(slett=True)
+    os.rename(claim, _sti(katalog, "done", os.path.basename(claim)))
+    print(f"✅ Shard {shard['id']}: {antall} rader")
+    return True
+
+
+def arbeid(katalog, vent=False, foreldet=None):
+    # Tar shards til køen er tom. Med vent=True ventes det også på shards som kjører andre steder,
+    # siden de kan feile og komme tilbake i todo/.
+    ferdige = 0
+    while True:
+        if foreldet:
+            frigi_foreldede(katalog, foreldet)
+        claim = ta_shard(katalog)
+        if claim is not None:
+            ferdige += kjor_shard(katalog, claim)
+            continue
+        if vent and os.listdir(_sti(katalog, "running")):
+            time.sleep(VENTETID)
+            continue
+        return ferdige
+
+
+def _arbeider(katalog, args):
+    # Kjører i en egen prosess (spawn), med egen klient, begrenser og cache-tilkobling
+    cristin_klient.konfigurer_fra_args(args)
+    try:
+        return arbeid(katalog)
+    finally:
+        cristin_klient.avslutt()
+
+
+def kjor_lokalt(katalog, args, arbeidere):
+    # Arbeiderne tømmer køen; shards som feilet og ble lagt tilbake tas i en ny runde
+    kontekst = multiprocessing.get_context("spawn")
+    while any(n.endswith(".json") for n in os.listdir(_sti(katalog, "todo"))):
+        with ProcessPoolExecutor(max_workers=arbeidere, mp_context=kontekst) as pool:
+            for f in [pool.submit(_arbeider, katalog, args) for _ in range(arbeidere)]:
+                f.result()
+
+
+def slaa_sammen(katalog, plan):
+    # Rader fra ferdige shards i planens rekkefølge. Unit-høstinger dedupliseres på Cristin Resultat-ID, og
+    # Units-kolonnen får alle unitene resultatet ble funnet under; personhøstinger på (person, resultat).
+    if plan["type"] == "unit":
+        rader = {}
+        for rad in _les_shardrader(katalog, plan):
+            tidligere = rader.get(rad["Cristin Resultat-ID"])
+            if tidligere is None:
+                rader[rad["Cristin Resultat-ID"]] = rad
+                continue
+            units = tidligere["Units"].split("; ") if tidligere["Units"] else []
+            tidligere["Units"] = "; ".join(units + [u for u in rad["Units"].split("; ") if u and u not in units])
+        yield from rader.values()
+        return
+
+    sett = set()
+    for rad in _les_shardrader(katalog, plan):
+        nokkel = (rad["Cristin-ID"], rad["Cristin Resultat-ID"])
+        if nokkel not in sett:
+            sett.add(nokkel)
+            yield rad
+
+
+def _les_shardrader(katalog, plan):
+    for shard_id in plan["shards"]:
+        filnavn = _sti(katalog, "done", f"{shard_id}.jsonl")
+        if not os.path.exists(filnavn):
+            continue
+        with open(filnavn, encoding="utf-8") as f:
+            for linje in f:
+                yield json.loads(linje)
+
+
+def status(katalog):
+    return {navn: sorted(n[:-5] for n in os.listdir(_sti(katalog, navn)) if n.endswith(".json"))
+            for navn in ("todo", "running", "done", "failed")}
+
+
+def lagre(katalog, utfil, filformat):
+    from cristin_skrivere import skriv_rader
+
+    plan = les_plan(katalog)
+    tilstand = status(katalog)
+    mangler = len(plan["shards"]) - len(tilstand["done"])
+    if mangler:
+        print(f"⚠️  {mangler} av {len(plan['shards'])} shards er ikke ferdige "
+              f"({len(tilstand['failed'])} feilet: {', '.join(tilstand['failed'][:5])}) – slår sammen resten")
+    if plan["type"] == "unit":
+        from hent_unit_publikasjoner import KOLONNER
+        utfil = utfil or f"unit_publikasjoner_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{filformat}"
+        antall = skriv_rader(slaa_sammen(katalog, plan), utfil, filformat, KOLONNER)
+    else:
+        from cristin_fetcher import OUTPUT_FILE
+        utfil = utfil or OUTPUT_FILE
+        antall = skriv_rader(slaa_sammen(katalog, plan), utfil, filformat)
+    print(f"✅ Lagret {antall} resultater fra {len(tilstand['done'])} shards til {utfil}")
+    return mangler
+
+
+def _planlegg_fra_args(args):
+    if bool(args.unit) == bool(args.ids):
+        raise SystemExit("❌ Oppgi enten --unit eller --ids")
+    if args.unit:
+        referanse.aktiver(args.ref_index)
+        units = referanse.units_fra_args(args)
+        start = args.start if args.start is not None else 2015
+        slutt = args.end if args.end is not None else datetime.now().year
+        shards = lag_unitshards(units, start, slutt, args.years_per_shard, args.pages_per_shard, args.lite)
+        referanse.avslutt()
+        type_ = "unit"
+    else:
+        from cristin_fetcher import END_YEAR, START_YEAR, les_cristin_ids
+        start = args.start if args.start is not None else START_YEAR
+        slutt = args.end if args.end is not None else END_YEAR
+        shards = lag_personshards(les_cristin_ids(args.ids), start, slutt, args.persons_per_shard)
+        type_ = "persons"
+    for shard in shards:
+        shard["maks_forsøk"] = args.max_attempts
+    planlegg(args.queue, shards, type_)
+
+
+def _legg_til_planargumenter(parser):
+    referanse.legg_til_unitargumenter(parser, påkrevd=False)
+    parser.add_argument("--ids", metavar="FILE", help="Fil med én Cristin person-ID per linje (i stedet for --unit)")
+    parser.add_argument("--start", type=int, help="Startår (standard som i verktøyet som høster)")
+    parser.add_argument("--end", type=int, help="Sluttår")
+    parser.add_argument("--lite", action="store_true", help="Unngå ekstra detaljkall (unit)")
+    parser.add_argument("--years-per-shard", type=int, help="Del årsintervallet i biter på så mange år (unit)")
+    parser.add_argument("--pages-per-shard", type=int, help="Del hver unit-liste i sideintervaller (unit)")
+    parser.add_argument("--persons-per-shard", type=int, default=PERSONER_PER_SHARD, help="Personer per shard")
+    parser.add_argument("--max-attempts", type=int, default=MAKS_FORSØK, help="Forsøk per shard før den gis opp")
+
+
+def _legg_til_utargumenter(parser):
+    parser.add_argument("--output", help="Utfil (standard som i verktøyet som høster)")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="Filformat")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Del en høsting i shards og kjør dem i flere prosesser eller på "
+                                                 "flere maskiner via en felles køkatalog.")
+    underkommandoer = parser.add_subparsers(dest="kommando", required=True)
+
+    kjor = underkommandoer.add_parser("run", help="Planlegg, kjør shardene i lokale prosesser og slå sammen")
+    _legg_til_planargumenter(kjor)
+    kjor.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Antall arbeidsprosesser")
+    _legg_til_utargumenter(kjor)
+
+    plan = underkommandoer.add_parser("plan", help="Legg shardene i køkatalogen")
+    _legg_til_planargumenter(plan)
+
+    arbeider = underkommandoer.add_parser("work", help="Ta og kjør shards fra køkatalogen til den er tom")
+    arbeider.add_argument("--wait", action="store_true", help="Vent på shards som kjører andre steder (kan feile og komme tilbake)")
+    arbeider.add_argument("--stale-after", type=float, metavar="SEKUNDER",
+                          help="Legg shards tilbake i køen når arbeideren ikke har gitt livstegn på så lenge")
+
+    slaa = underkommandoer.add_parser("merge", help="Slå sammen ferdige shards til én fil")
+    _legg_til_utargumenter(slaa)
+
+    underkommandoer.add_parser("status", help="Vis hvor mange shards som venter, kjører, er ferdige eller feilet")
+    underkommandoer.add_parser("retry", help="Legg feilede shards tilbake i køen med nye forsøk")
+
+    for underparser in underkommandoer.choices.values():
+        underparser.add_argument("--queue", required=True, metavar="DIR", help="Køkatalog (delt mellom maskinene)")
+    for underparser in (kjor, plan, arbeider):
+        cristin_klient.legg_til_http_argumenter(underparser)
+    args = parser.parse_args(argv)
+
+    if args.kommando in ("run", "plan", "work"):
+        if args.kommando == "run" and args.record and args.workers > 1:
+            parser.error("--record kan ikke brukes med flere arbeidsprosesser")
+        cristin_klient.konfigurer_fra_args(args)
+
+    if args.kommando == "status":
+        for navn, shards in status(args.queue).items():
+            print(f"{navn:<8} {len(shards):>5}  {', '.join(shards[:5])}{' …' if len(shards) > 5 else ''}")
+        return 0
+    if args.kommando == "retry":
+        legg_tilbake_feilede(args.queue)
+        return 0
+
+    if args.kommando in ("run", "plan") and not (args.kommando == "run" and os.path.exists(_sti(args.queue, "plan.json"))):
+        _planlegg_fra_args(args)
+    elif args.kommando == "run":
+        # Shards som sto i running/ da en tidligere lokal kjøring ble avbrutt, kjøres på nytt
+        frigi_foreldede(args.queue, 0)
+        print(f"↩️  Fortsetter planen i '{args.queue}'")
+
+    if args.kommando == "work":
+        ferdige = arbeid(args.queue, args.wait, args.stale_after)
+        print(f"🏁 {ferdige} shards kjørt på {socket.gethostname()}")
+    elif args.kommando == "run":
+        kjor_lokalt(args.queue, args, max(1, args.workers))
+
+    if args.kommando in ("run", "merge"):
+        mangler = lagre(args.queue, args.output, args.format)
+        cristin_klient.avslutt()
+        return 1 if mangler else 0
+    cristin_klient.avslutt()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
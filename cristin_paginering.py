@@ -0,0 +1,145 @@
+import math
+import queue
+import threading
+
+import cristin_klient
+from cristin_poster import les_json, tolk_resultat
+
+PER_PAGE = 100
+
+_SLUTT = object()
+
+
+def paginer_resultater(url, startaar, sluttaar, kategorier=None, hent=cristin_klient.hent, per_page=PER_PAGE,
+                       ekstra_params=None):
+    # Gir Resultat-poster innenfor årsintervallet, se paginer_sider
+    for _, utvalgte in paginer_sider(url, startaar, sluttaar, kategorier, hent, per_page,
+                                     ekstra_params=ekstra_params):
+        yield from utvalgte
+
+
+def paginer_sider(url, startaar, sluttaar, kategorier=None, hent=cristin_klient.hent, per_page=PER_PAGE, forste_side=1,
+                  ekstra_params=None, forhandshenting=None, siste_side=None):
+    # Sidene hentes i en egen tråd, inntil `forhandshenting` sider foran den som behandles
+    # (standard: cristin_klient.forhandshenting, 0 = hent hver side først når den trengs).
+    # Med siste_side stoppes det etter den siden (brukes når listen deles i sideintervaller).
+    sider = _hent_sider(url, startaar, sluttaar, kategorier, hent, per_page, forste_side, ekstra_params, siste_side)
+    antall = cristin_klient.forhandshenting if forhandshenting is None else forhandshenting
+    return forhandshent(sider, antall) if antall > 0 else sider
+
+
+def forhandshent(elementer, antall):
+    # Produsent/konsument: en egen tråd går gjennom `elementer` og legger dem i en begrenset kø, slik at
+    # neste side lastes ned mens forrige behandles. Er køen full, venter produsenten (mottrykk).
+    kø = queue.Queue(maxsize=antall)
+    stopp = threading.Event()
+
+    def legg_i_kø(element):
+        while not stopp.is_set():
+            try:
+                kø.put(element, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produser():
+        try:
+            for element in elementer:
+                if not legg_i_kø((None, element)):
+                    return
+            legg_i_kø((None, _SLUTT))
+        except BaseException as e:  # Feilen kastes videre hos konsumenten
+            legg_i_kø((e, None))
+        finally:
+            elementer.close()
+
+    tråd = threading.Thread(target=produser, name="forhandshenting", daemon=True)
+    tråd.start()
+    try:
+        while True:
+            feil, element = kø.get()
+            if feil is not None:
+                raise feil
+            if element is _SLUTT:
+                return
+            yield element
+    finally:
+        # Konsumenten kan avslutte tidlig; produsenten stoppes før vi går videre
+        stopp.set()
+        tråd.join()
+
+
+def _hent_sider(url, startaar, sluttaar, kategorier, hent, per_page, forste_side, ekstra_params, siste_side=None):
+    # Går gjennom en resultatliste side for side og gir (sidenummer, [Resultat, ...]) for resultater
+    # innenfor årsintervallet. Postene tolkes her (i forhåndshentingstråden), så de rå sidene kan slippes.
+    # År- og kategorifilter sendes til API-et der det er mulig, og filtreres uansett også lokalt.
+    # Listen sorteres synkende på år, så vi kan stoppe så snart en side går under startåret.
+    params = {
+        "per_page": per_page,
+        "sort": "year_published",
+        "order": "desc",
+        "published_since": startaar,
+        "published_before": sluttaar + 1,
+        **(ekstra_params or {}),
+    }
+    if kategorier and len(kategorier) == 1:
+        params["category"] = next(iter(kategorier))
+
+    side = forste_side
+    hentet = 0
+    totalt = None
+    stoppet_tidlig = False
+    sortert = True  # Slås av hvis API-et ikke respekterer sorteringen
+    forrige_aar = None
+
+    while True:
+        resp = hent(url, params={**params, "page": side})
+        if resp.status_code != 200:
+            # Resten av listen mangler; feilen registreres (forbigående feil er allerede registrert av
+            # klienten), så deltamodus og journalen ikke tar den avkortede listen for å være komplett
+            print(f"❌ Feil ved kall til API (side {side}): {resp.status_code}")
+            if resp.status_code not in cristin_klient.RETRY_STATUS:
+                cristin_klient.registrer_feil(url, {**params, "page": side}, f"HTTP {resp.status_code}")
+            break
+        if totalt is None and resp.headers.get("X-Total-Count", "").isdigit():
+            totalt = int(resp.headers["X-Total-Count"])
+
+        resultater = les_json(resp)
+        if not resultater:
+            break
+        hentet += len(resultater)
+
+        laveste_aar = None
+        utvalgte = []
+        for pub in resultater:
+            try:
+                aar = int(pub.get("year_published", 0))
+            except (ValueError, TypeError):
+                continue
+            laveste_aar = aar if laveste_aar is None else min(laveste_aar, aar)
+            if forrige_aar is not None and aar > forrige_aar:
+                sortert = False
+            forrige_aar = aar
+
+            if not (startaar <= aar <= sluttaar):
+                continue
+            if kategorier and pub.get("category", {}).get("code", "") not in kategorier:
+                continue
+            utvalgte.append(tolk_resultat(pub, aar))
+        yield side, utvalgte
+
+        if sortert and laveste_aar is not None and laveste_aar < startaar:
+            stoppet_tidlig = True
+            break
+        if len(resultater) < per_page or side == siste_side:
+            break
+        side += 1
+
+    if stoppet_tidlig:
+        if totalt is not None:
+            sider_totalt = math.ceil(totalt / per_page)
+            print(f"⏭️  Stoppet etter side {side}: hoppet over {max(sider_totalt - side, 0)} sider "
+                  f"({max(totalt - (forste_side - 1) * per_page - hentet, 0)} poster) utenfor årsintervallet")
+        else:
+            print(f"⏭️  Stoppet etter side {side}: resten av listen er eldre enn {startaar}")
@@ -0,0 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def kjor_parallelt(funksjon, elementer, samtidighet=1):
+    # Kjører funksjon(element) for alle elementer med maks `samtidighet` kall i gang samtidig.
+    # Resultatene returneres i samme rekkefølge som elementene, akkurat som den sekvensielle veien.
+    # HTTP-kallene går gjennom den delte, synkrone klienten (pool, cache), så vanlige tråder holder.
+    elementer = list(elementer)
+    if samtidighet <= 1 or len(elementer) <= 1:
+        return [funksjon(e) for e in elementer]
+    with ThreadPoolExecutor(max_workers=min(samtidighet, len(elementer))) as pool:
+        return list(pool.map(funksjon, elementer))
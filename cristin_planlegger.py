@@ -0,0 +1,57 @@
+import threading
+from collections import Counter
+
+# Listeendepunktene kan gi fulle resultatobjekter (fields=all) og store sider. Planleggeren avgjør per
+# resultat om listeposten allerede har feltene vi trenger, og faller bare tilbake til
+# /results/{id} og /results/{id}/contributors når den mangler noe.
+BULK_PARAMS = {"fields": "all"}
+BULK_PER_PAGE = 1000
+
+# Kategorier som normalt har journal (og dermed NVI-nivå) i detaljvisningen
+JOURNALKATEGORIER_PREFIKS = ("ARTICLE", "ACADEMICREVIEW")
+
+_lås = threading.Lock()
+teller = Counter()
+
+
+def _tell(nokkel, unngått):
+    with _lås:
+        teller[f"{nokkel}_planlagt"] += 1
+        if unngått:
+            teller[f"{nokkel}_unngått"] += 1
+
+
+def har_nvi(pub):
+    journal = pub.get("journal")
+    if isinstance(journal, dict):
+        return "nvi_level" in journal or "nvi_level" in journal.get("publisher", {})
+    return "journal" not in pub and not pub.get("category", {}).get("code", "").startswith(JOURNALKATEGORIER_PREFIKS)
+
+
+def trenger_detaljer(post):
+    # post: Resultat fra cristin_poster
+    trenger = not post.nvi_kjent
+    _tell("detaljer", not trenger)
+    return trenger
+
+
+def trenger_bidragsytere(post, med_affiliasjoner=False):
+    # Forhåndsvisningen er nok når den dekker alle bidragsytere og har feltene som trengs
+    forhandsvisning = post.bidragsytere
+    komplett = (
+        post.antall_bidragsytere is not None
+        and len(forhandsvisning) >= post.antall_bidragsytere
+        and (not med_affiliasjoner or all(b.affiliasjoner is not None for b in forhandsvisning))
+    )
+    _tell("bidragsytere", komplett)
+    return not komplett
+
+
+def skriv_oppsummering():
+    deler = []
+    for nokkel, navn in (("detaljer", "detaljkall"), ("bidragsytere", "bidragsyterkall")):
+        planlagt = teller[f"{nokkel}_planlagt"]
+        if planlagt:
+            deler.append(f"unngikk {teller[f'{nokkel}_unngått']} av {planlagt} {navn}")
+    if deler:
+        print(f"🧮 Planlegger: {', '.join(deler)}")
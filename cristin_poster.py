@@ -0,0 +1,191 @@
+import hashlib
+import json
+from dataclasses import dataclass
+
+from cristin_planlegger import har_nvi
+
+# Felles tolking av API-svar. Resultater og bidragsytere gjøres om til kompakte poster (slots) så snart
+# de kommer inn, slik at de rå JSON-objektene kan slippes med en gang. Alle verktøyene bruker samme regler
+# for tittel, kanal og NVI-nivå.
+
+try:
+    import orjson  # Valgfri, raskere JSON-dekoding
+except ImportError:
+    orjson = None
+
+
+def les_json(resp):
+    # Dekoder svaret direkte fra bytes
+    return orjson.loads(resp.content) if orjson is not None else json.loads(resp.content)
+
+
+@dataclass(slots=True)
+class Affiliasjon:
+    unit_id: str = None
+    unit_url: str = None
+    inst_id: str = None
+    inst_url: str = None
+
+
+@dataclass(slots=True)
+class Bidragsyter:
+    rekkefolge: int
+    person_id: str = None
+    fornavn: str = ""
+    etternavn: str = ""
+    affiliasjoner: tuple = None  # None når posten ikke hadde affiliasjoner med (f.eks. i forhåndsvisningen)
+
+    @property
+    def navn(self):
+        return f"{self.fornavn} {self.etternavn}".strip()
+
+
+@dataclass(slots=True)
+class Resultat:
+    resultat_id: str
+    aar: int = None
+    tittel: str = "(Uten tittel)"
+    kategori: str = ""
+    kategori_kode: str = None
+    publiseringssted: str = "Ukjent"
+    kanal_kilde: str = ""
+    media_type: str = ""
+    nvi: str = "-"
+    url: str = ""
+    nvi_kjent: bool = False  # Posten har det som trengs for NVI-nivå, se cristin_planlegger.har_nvi
+    bidragsytere: tuple = ()  # Forhåndsvisningen i listeposten
+    antall_bidragsytere: int = None
+    endret: str = None  # last_modified, eller hash av posten når API-et ikke oppgir det (se cristin_delta)
+
+
+def bestem_publiseringssted(pub, kategori):
+    kanal = ""
+    kilde = ""
+
+    # === 1: Journal
+    journal = pub.get("journal")
+    if isinstance(journal, dict) and isinstance(journal.get("name"), str):
+        kanal = journal["name"]
+        kilde = "journal.name"
+
+    # === 2: Publisher
+    if not kanal and isinstance(pub.get("publisher"), dict):
+        kanal = pub["publisher"].get("name", "")
+        if kanal:
+            kilde = "publisher.name"
+
+    # === 3: Lecture / Academic lecture – organiser/event
+    if not kanal and kategori.lower() in ["lecture", "academic lecture"]:
+        kanal = pub.get("organiser", "")
+        if kanal:
+            kilde = "organiser"
+        elif pub.get("event", {}).get("arranged_by", {}).get("name"):
+            kanal = pub["event"]["arranged_by"]["name"]
+            kilde = "event.arranged_by.name"
+        elif pub.get("event", {}).get("name") and pub.get("event", {}).get("location"):
+            kanal = f"{pub['event']['name']} – {pub['event']['location']}"
+            kilde = "event.name + location"
+        elif pub.get("event", {}).get("name"):
+            kanal = pub["event"]["name"]
+            kilde = "event.name"
+
+    # === 4: Doctoral dissertation – series
+    if not kanal and kategori.lower() == "doctoral dissertation":
+        kanal = pub.get("series", {}).get("name", "")
+        if kanal:
+            kilde = "series.name"
+
+    # === 5: place
+    if not kanal and pub.get("place"):
+        kanal = pub["place"]
+        kilde = "place"
+
+    # === 6: media_type
+    if not kanal and pub.get("media_type", {}).get("code_name", {}).get("en"):
+        kanal = pub["media_type"]["code_name"]["en"]
+        kilde = "media_type.code_name"
+
+    # === 7: channel.title
+    if not kanal and pub.get("channel", {}).get("title"):
+        kanal = pub["channel"]["title"]
+        kilde = "channel.title"
+
+    if not kanal:
+        kanal = "Ukjent"
+        kilde = "Ingen relevante felter funnet"
+
+    return kanal, kilde
+
+
+def _nvi(pub):
+    journal = pub.get("journal", {})
+    if isinstance(journal, dict):
+        return journal.get("nvi_level") or journal.get("publisher", {}).get("nvi_level") or "-"
+    return "-"
+
+
+def _media_type(pub):
+    media_type = pub.get("media_type")
+    if isinstance(media_type, dict):
+        return media_type.get("code_name", {}).get("en", "")
+    return media_type if isinstance(media_type, str) else ""
+
+
+def _endret(pub):
+    endret = (pub.get("last_modified") or {}).get("date")
+    if endret:
+        return endret
+    return "sha1:" + hashlib.sha1(json.dumps(pub, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def tolk_resultat(pub, aar=None):
+    # Fra liste- eller detaljpost til Resultat
+    kategori = pub.get("category", {}).get("name", {}).get("en", "")
+    publiseringssted, kanal_kilde = bestem_publiseringssted(pub, kategori)
+    bidrag = pub.get("contributors", {})
+    return Resultat(
+        resultat_id=pub.get("cristin_result_id"),
+        aar=aar,
+        tittel=pub.get("title", {}).get(pub.get("original_language", ""), "(Uten tittel)"),
+        kategori=kategori,
+        kategori_kode=pub.get("category", {}).get("code"),
+        publiseringssted=publiseringssted,
+        kanal_kilde=kanal_kilde,
+        media_type=_media_type(pub),
+        nvi=_nvi(pub),
+        url=pub.get("url", ""),
+        nvi_kjent=har_nvi(pub),
+        bidragsytere=tolk_bidragsytere(bidrag.get("preview", [])),
+        antall_bidragsytere=bidrag.get("count") if isinstance(bidrag.get("count"), int) else None,
+        endret=_endret(pub),
+    )
+
+
+def tolk_bidragsytere(personer):
+    # Fra /results/{id}/contributors (eller forhåndsvisningen) til Bidragsyter-poster
+    return tuple(
+        Bidragsyter(
+            rekkefolge=c.get("order", rekkefolge),
+            person_id=c.get("cristin_person_id"),
+            fornavn=c.get("first_name", ""),
+            etternavn=c.get("surname", ""),
+            affiliasjoner=tuple(_tolk_affiliasjon(a) for a in c["affiliations"]) if "affiliations" in c else None,
+        )
+        for rekkefolge, c in enumerate(personer, start=1)
+    )
+
+
+def _tolk_affiliasjon(a):
+    unit = a.get("unit") or {}
+    inst = a.get("institution") or {}
+    return Affiliasjon(unit.get("cristin_unit_id"), unit.get("url"), inst.get("cristin_institution_id"), inst.get("url"))
+
+
+def lagerrad(post, **ekstra):
+    # Rad til results-tabellen i kolonnelageret
+    return {
+        "cristin_result_id": post.resultat_id, "tittel": post.tittel, "aar": post.aar, "kategori": post.kategori,
+        "kategori_kode": post.kategori_kode, "publiseringssted": post.publiseringssted,
+        "kanal_kilde": post.kanal_kilde, "media_type": post.media_type, "nvi_niva": post.nvi, "url": post.url,
+        **ekstra,
+    }
@@ -0,0 +1,80 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# === KONFIG ===
+START_RATE = 10.0       # forespørsler per sekund
+MIN_RATE = 0.5
+MAKS_RATE = 50.0
+MAAL_LATENS = 1.0       # sekunder; tregere svar enn dette tolkes som at API-et er presset
+BACKOFF_BASIS = 1.0
+BACKOFF_TAK = 60.0
+
+
+class AdaptivBegrenser:
+    # Token bucket der raten justeres etter observert latens og feil (AIMD):
+    # raske, vellykkede svar øker raten litt, feil og trege svar senker den kraftig.
+    def __init__(self, rate=START_RATE, min_rate=MIN_RATE, maks_rate=MAKS_RATE, maal_latens=MAAL_LATENS):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.maks_rate = maks_rate
+        self.maal_latens = maal_latens
+        self.sovet = 0.0
+        self._tokens = 1.0
+        self._sist = time.monotonic()
+        self._pause_til = 0.0
+        self._lås = threading.Lock()
+
+    def vent(self):
+        # Reserver et token og sov utenfor låsen til det er vår tur
+        with self._lås:
+            nå = time.monotonic()
+            self._tokens = min(1.0, self._tokens + (nå - self._sist) * self.rate)
+            self._sist = nå
+            self._tokens -= 1.0
+            ventetid = max(-self._tokens / self.rate, self._pause_til - nå, 0.0)
+        if ventetid > 0:
+            self._sov(ventetid)
+        return ventetid
+
+    def registrer(self, latens, ok):
+        with self._lås:
+            if not ok:
+                self.rate = max(self.min_rate, self.rate / 2)
+            elif latens > 2 * self.maal_latens:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+            elif latens < self.maal_latens:
+                self.rate = min(self.maks_rate, self.rate + 0.5)
+
+    def pause(self, sekunder):
+        # Retry-After gjelder alle tråder, ikke bare den som fikk svaret
+        with self._lås:
+            self._pause_til = max(self._pause_til, time.monotonic() + sekunder)
+
+    def backoff(self, forsøk):
+        tak = min(BACKOFF_TAK, BACKOFF_BASIS * 2 ** forsøk)
+        ventetid = random.uniform(BACKOFF_BASIS / 2, tak)
+        self._sov(ventetid)
+        return ventetid
+
+    def _sov(self, sekunder):
+        time.sleep(sekunder)
+        with self._lås:
+            self.sovet += sekunder
+
+
+def les_retry_after(verdi):
+    if not verdi:
+        return None
+    verdi = verdi.strip()
+    if verdi.isdigit():
+        return float(verdi)
+    try:
+        tidspunkt = parsedate_to_datetime(verdi)
+    except (TypeError, ValueError):
+        return None
+    if tidspunkt.tzinfo is None:
+        tidspunkt = tidspunkt.replace(tzinfo=timezone.utc)
+    return max(0.0, (tidspunkt - datetime.now(timezone.utc)).total_seconds())
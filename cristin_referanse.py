@@ -0,0 +1,268 @@
+import argparse
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import cristin_klient
+
+# Lokal referanseindeks over units og institusjoner, slik at landkode, institusjon og unit-hierarki
+# kan slås opp i minnet i stedet for ett API-kall per affiliasjon. Katalogene lastes ned side for side;
+# ved oppdatering sendes sidens ETag, og uendrede sider (304) gjenbrukes uten å parses på nytt.
+#
+#   python cristin_referanse.py refresh
+#   python cristin_referanse.py subunits 1.1.0.0
+#   python cristin_referanse.py lookup 1.1.0.0
+
+STANDARD_INDEKS = "cristin_referanse.json.gz"
+PER_PAGE = 1000
+
+# Kompakte rader: units -> [landkode, institusjon, overordnet unit, navn], institutions -> [landkode, navn]
+UNIT_LAND, UNIT_INST, UNIT_FORELDER, UNIT_NAVN = range(4)
+INST_LAND, INST_NAVN = range(2)
+
+_indeks = None
+
+
+def _navn(data, felt):
+    navn = data.get(felt) or {}
+    return navn.get("en") or navn.get("nb")
+
+
+def unit_rad(data):
+    return [
+        data.get("country"),
+        (data.get("institution") or {}).get("cristin_institution_id"),
+        (data.get("parent_unit") or {}).get("cristin_unit_id"),
+        _navn(data, "unit_name"),
+    ]
+
+
+def institusjon_rad(data):
+    return [data.get("country_code"), _navn(data, "institution_name")]
+
+
+class Referanseindeks:
+    def __init__(self, filnavn=STANDARD_INDEKS):
+        self.filnavn = filnavn
+        self.units = {}
+        self.institutions = {}
+        self.sider = {"units": {}, "institutions": {}}
+        self.oppdatert = None
+        self.endret = False
+        self._barn = None
+        if os.path.exists(filnavn):
+            with gzip.open(filnavn, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            self.units = data.get("units", {})
+            self.institutions = data.get("institutions", {})
+            self.sider = data.get("sider", self.sider)
+            self.oppdatert = data.get("oppdatert")
+
+    def lagre(self):
+        midlertidig = f"{self.filnavn}.tmp"
+        with gzip.open(midlertidig, "wt", encoding="utf-8") as f:
+            json.dump({"oppdatert": self.oppdatert, "units": self.units, "institutions": self.institutions,
+                       "sider": self.sider}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(midlertidig, self.filnavn)
+        self.endret = False
+
+    # === Oppslag (kun i minnet)
+    def unit(self, unit_id):
+        return self.units.get(unit_id)
+
+    def institusjon(self, inst_id):
+        return self.institutions.get(inst_id)
+
+    def registrer_unit(self, data):
+        unit_id = data.get("cristin_unit_id")
+        if unit_id:
+            self.units[unit_id] = unit_rad(data)
+            self._barn = None
+            self.endret = True
+
+    def registrer_institusjon(self, data):
+        inst_id = data.get("cristin_institution_id")
+        if inst_id:
+            self.institutions[inst_id] = institusjon_rad(data)
+            self.endret = True
+
+    # === Hierarki
+    def barn(self, unit_id):
+        if self._barn is None:
+            self._barn = defaultdict(list)
+            for uid, rad in self.units.items():
+                if rad[UNIT_FORELDER]:
+                    self._barn[rad[UNIT_FORELDER]].append(uid)
+        return sorted(self._barn.get(unit_id, []))
+
+    def underenheter(self, unit_id):
+        # Uniten selv og alle enheter under den, bredde først
+        resultat = [unit_id]
+        for uid in resultat:
+            resultat.extend(self.barn(uid))
+        return resultat
+
+    # === Nedlasting
+    def oppdater(self, per_page=PER_PAGE):
+        for tabell, registrer in (("units", unit_rad), ("institutions", institusjon_rad)):
+            self._oppdater_katalog(tabell, registrer, per_page)
+        self.oppdatert = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._barn = None
+        self.endret = True
+
+    def _oppdater_katalog(self, tabell, lag_rad, per_page):
+        url = f"{cristin_klient.CRISTIN_API_BASE}/{tabell}"
+        rader = getattr(self, tabell)
+        gamle_sider = self.sider[tabell]
+        sider = {}
+        sett = set()
+        uendret = nye = 0
+        side = 1
+        while True:
+            forrige = gamle_sider.get(str(side), {})
+            # ETag gjelder bare når sidestørrelsen er den samme som sist
+            etag = forrige.get("etag") if forrige.get("per_page") == per_page else None
+            resp = cristin_klient.hent_betinget(url, {"page": side, "per_page": per_page}, etag)
+            if resp.status_code == 304 and all(i in rader for i in forrige["ider"]):
+                ider = forrige["ider"]
+                uendret += 1
+            elif resp.status_code == 200:
+                poster = resp.json()
+                nokkel = "cristin_unit_id" if tabell == "units" else "cristin_institution_id"
+                ider = []
+                for post in poster:
+                    rader[post[nokkel]] = lag_rad(post)
+                    ider.append(post[nokkel])
+                nye += 1
+            else:
+                raise cristin_klient.HentingFeilet(f"{url} side {side}: HTTP {resp.status_code}")
+            sider[str(side)] = {"etag": resp.headers.get("ETag") or forrige.get("etag"), "per_page": per_page,
+                                "ider": ider}
+            sett.update(ider)
+            if len(ider) < per_page:
+                break
+            side += 1
+
+        # Enheter som ikke lenger finnes i katalogen fjernes
+        fjernet = [i for i in rader if i not in sett]
+        for i in fjernet:
+            del rader[i]
+        self.sider[tabell] = sider
+        print(f"📚 {tabell}: {len(rader)} i indeksen ({nye} sider lastet ned, {uendret} uendret, "
+              f"{len(fjernet)} fjernet)")
+
+
+# === Delt indeks for analyseskriptene (no-op når indeksen ikke er aktivert)
+def aktiver(filnavn):
+    global _indeks
+    if not filnavn:
+        _indeks = None
+        return None
+    if not os.path.exists(filnavn):
+        print(f"⚠️  Fant ikke referanseindeksen {filnavn} – kjør 'python cristin_referanse.py refresh' først")
+    _indeks = Referanseindeks(filnavn)
+    return _indeks
+
+
+def registrer_unit(data):
+    if _indeks is not None:
+        _indeks.registrer_unit(data)
+
+
+def registrer_institusjon(data):
+    if _indeks is not None:
+        _indeks.registrer_institusjon(data)
+
+
+def utvid_underenheter(unit_ids):
+    # Hver unit utvides til seg selv og alle enheter under den. Indeksen brukes når den kjenner uniten,
+    # ellers følges 'subunits' i /units/{id}.
+    resultat = list(dict.fromkeys(unit_ids))
+    sett = set(resultat)
+    for unit_id in resultat:
+        if _indeks is not None and _indeks.unit(unit_id) is not None:
+            barn = _indeks.barn(unit_id)
+        else:
+            resp = cristin_klient.hent(f"{cristin_klient.CRISTIN_API_BASE}/units/{unit_id}")
+            if resp.status_code != 200:
+                print(f"⚠️  Fant ikke unit {unit_id} (HTTP {resp.status_code}), utvides ikke")
+                continue
+            data = resp.json()
+            registrer_unit(data)
+            barn = [s["cristin_unit_id"] for s in data.get("subunits", []) if s.get("cristin_unit_id")]
+        for b in barn:
+            if b not in sett:
+                sett.add(b)
+                resultat.append(b)
+    return resultat
+
+
+def legg_til_unitargumenter(parser, beskrivelse="Cristin Unit-ID, f.eks. 192.11.0.0", påkrevd=True):
+    parser.add_argument("--unit", required=påkrevd, nargs="+", help=f"{beskrivelse} (flere kan oppgis)")
+    parser.add_argument("--subtree", action="store_true", help="Ta med alle underenheter av de oppgitte unitene")
+    legg_til_indeksargument(parser)
+
+
+def units_fra_args(args):
+    # Kalles etter aktiver(args.ref_index)
+    units = utvid_underenheter(args.unit) if args.subtree else list(dict.fromkeys(args.unit))
+    if len(units) > 1:
+        print(f"🏢 {len(units)} units: {', '.join(units[:10])}{' …' if len(units) > 10 else ''}")
+    return units
+
+
+def avslutt():
+    # Oppslag som måtte gå mot API-et (bom i indeksen) skrives tilbake
+    global _indeks
+    if _indeks is not None and _indeks.endret:
+        _indeks.lagre()
+    _indeks = None
+
+
+def legg_til_indeksargument(parser):
+    parser.add_argument("--ref-index", nargs="?", const=STANDARD_INDEKS, metavar="FILE",
+                        help=f"Slå opp units/institusjoner i lokal referanseindeks (standard: {STANDARD_INDEKS})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokal referanseindeks over Cristin-units og -institusjoner.")
+    parser.add_argument("--index", default=STANDARD_INDEKS, help=f"Indeksfil (standard: {STANDARD_INDEKS})")
+    kommandoer = parser.add_subparsers(dest="kommando", required=True)
+    oppdater = kommandoer.add_parser("refresh", help="Last ned eller oppdater unit- og institusjonskatalogen")
+    oppdater.add_argument("--per-page", type=int, default=PER_PAGE)
+    cristin_klient.legg_til_http_argumenter(oppdater)
+    under = kommandoer.add_parser("subunits", help="List en unit og alle enheter under den")
+    under.add_argument("unit")
+    oppslag = kommandoer.add_parser("lookup", help="Vis det indeksen vet om en unit eller institusjon")
+    oppslag.add_argument("id")
+    args = parser.parse_args(argv)
+
+    indeks = Referanseindeks(args.index)
+    if args.kommando == "refresh":
+        cristin_klient.konfigurer_fra_args(args)
+        indeks.oppdater(args.per_page)
+        indeks.lagre()
+        print(f"✅ Referanseindeks lagret i {args.index} ({os.path.getsize(args.index) / 1024:.0f} KiB)")
+        cristin_klient.avslutt()
+    elif args.kommando == "subunits":
+        if indeks.unit(args.unit) is None:
+            raise SystemExit(f"❌ Fant ikke unit {args.unit} i {args.index}")
+        for uid in indeks.underenheter(args.unit):
+            print(f"{uid}\t{indeks.unit(uid)[UNIT_NAVN] or ''}")
+    else:
+        unit = indeks.unit(args.id)
+        if unit is not None:
+            inst = indeks.institusjon(unit[UNIT_INST]) or [None, None]
+            print(f"Unit {args.id}: {unit[UNIT_NAVN]} (land {unit[UNIT_LAND]}, institusjon {unit[UNIT_INST]} "
+                  f"{inst[INST_NAVN]}, overordnet {unit[UNIT_FORELDER]})")
+        inst = indeks.institusjon(args.id)
+        if inst is not None:
+            print(f"Institusjon {args.id}: {inst[INST_NAVN]} (land {inst[INST_LAND]})")
+        if unit is None and inst is None:
+            raise SystemExit(f"❌ Fant ikke {args.id} i {args.index}")
+
+
+if __name__ == "__main__":
+    main()
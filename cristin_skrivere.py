@@ -0,0 +1,83 @@
+import csv
+
+import cristin_statistikk as statistikk
+
+
+class CsvSkriver:
+    # Skriver rader til CSV etter hvert som de kommer. Uten oppgitte feltnavn brukes nøklene i første rad,
+    # og filen opprettes først når den første raden skrives.
+    def __init__(self, filnavn, feltnavn=None):
+        self.filnavn = filnavn
+        self.feltnavn = list(feltnavn) if feltnavn else None
+        self.antall = 0
+        self._fil = None
+        self._writer = None
+        if self.feltnavn:
+            self._aapne()
+
+    def _aapne(self):
+        self._fil = open(self.filnavn, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._fil, fieldnames=self.feltnavn)
+        self._writer.writeheader()
+
+    def skriv(self, rad):
+        if self._writer is None:
+            self.feltnavn = list(rad.keys())
+            self._aapne()
+        self._writer.writerow(rad)
+        self.antall += 1
+
+    def lukk(self):
+        if self._fil is not None:
+            self._fil.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.lukk()
+
+
+class XlsxSkriver:
+    # openpyxl i write-only-modus holder ikke cellene i minnet, så minnebruken er flat uansett antall rader
+    def __init__(self, filnavn, feltnavn=None, arknavn="Publikasjoner"):
+        from openpyxl import Workbook
+
+        self.filnavn = filnavn
+        self.feltnavn = list(feltnavn) if feltnavn else None
+        self.antall = 0
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet(arknavn)
+        if self.feltnavn:
+            self._ws.append(self.feltnavn)
+
+    def skriv(self, rad):
+        if self.feltnavn is None:
+            self.feltnavn = list(rad.keys())
+            self._ws.append(self.feltnavn)
+        self._ws.append([rad.get(k) for k in self.feltnavn])
+        self.antall += 1
+
+    def lukk(self):
+        if self.antall or self.feltnavn:
+            self._wb.save(self.filnavn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.lukk()
+
+
+def lag_skriver(filnavn, filformat, feltnavn=None):
+    if filformat == "xlsx":
+        return XlsxSkriver(filnavn, feltnavn)
+    return CsvSkriver(filnavn, feltnavn)
+
+
+def skriv_rader(rader, filnavn, filformat="csv", feltnavn=None):
+    with lag_skriver(filnavn, filformat, feltnavn) as skriver:
+        for rad in rader:
+            with statistikk.fase("skriving"):
+                skriver.skriv(rad)
+    return skriver.antall
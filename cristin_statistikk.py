@@ -0,0 +1,148 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Instrumentering av henting og faser. Klienten registrerer hvert kall (endepunktklasse, latens, status,
+# bytes, retry, cachetreff), skriptene måler fasene sine med fase(), og alt skrives som JSON med --stats-file.
+# Tid i fasene oppgis både totalt og hvor mye av den som gikk til nettkall (inkl. ventetid i begrenseren).
+# Modulen importerer ikke klienten eller cachen (og dermed requests); verktøy uten nettkall, som
+# split_per_person_excel.py, får en rapport med bare fasene sine.
+
+# Øvre grenser (ms) for latenshistogrammet
+HISTOGRAM_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_lås = threading.Lock()
+_lokal = threading.local()
+_start = time.perf_counter()
+_startet = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+_latenser = defaultdict(list)
+_status = defaultdict(Counter)
+_teller = defaultdict(Counter)
+_faser = defaultdict(Counter)
+
+
+def registrer_kall(url, latens, status, antall_bytes):
+    from cristin_cache import endepunktklasse  # kalles bare fra klienten, som allerede har lastet cachen
+
+    klasse = endepunktklasse(url)
+    with _lås:
+        _latenser[klasse].append(latens)
+        _status[klasse][str(status)] += 1
+        _teller[klasse]["bytes"] += antall_bytes
+
+
+def registrer(url, hendelse):
+    # Hendelser: retry, feil (tilkobling/timeout), cache_treff, revalidert, minnetreff, sammenslått
+    from cristin_cache import endepunktklasse
+
+    with _lås:
+        _teller[endepunktklasse(url)][hendelse] += 1
+
+
+@contextmanager
+def nettkall():
+    # Rundt hele hentingen av ett kall, inkludert retries og venting, slik at fasene kan trekke det fra
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _lokal.nett = getattr(_lokal, "nett", 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def fase(navn):
+    start = time.perf_counter()
+    nett_for = getattr(_lokal, "nett", 0.0)
+    try:
+        yield
+    finally:
+        tid = time.perf_counter() - start
+        nett = getattr(_lokal, "nett", 0.0) - nett_for
+        with _lås:
+            _faser[navn]["antall"] += 1
+            _faser[navn]["sekunder"] += tid
+            _faser[navn]["herav_nett"] += nett
+
+
+def _persentil(sortert, p):
+    if not sortert:
+        return None
+    indeks = min(len(sortert) - 1, max(0, round(p / 100 * len(sortert) + 0.5) - 1))
+    return round(sortert[indeks] * 1000, 1)
+
+
+def _histogram(sortert):
+    buckets = Counter()
+    for latens in sortert:
+        ms = latens * 1000
+        grense = next((g for g in HISTOGRAM_MS if ms <= g), None)
+        buckets[f"<={grense}" if grense else f">{HISTOGRAM_MS[-1]}"] += 1
+    return {b: buckets[b] for b in [f"<={g}" for g in HISTOGRAM_MS] + [f">{HISTOGRAM_MS[-1]}"] if buckets[b]}
+
+
+def rapport():
+    endepunkter = {}
+    with _lås:
+        for klasse in sorted(set(_latenser) | set(_teller)):
+            sortert = sorted(_latenser[klasse])
+            endepunkter[klasse] = {
+                "requests": len(sortert),
+                "status": dict(_status[klasse]),
+                "bytes": _teller[klasse]["bytes"],
+                "retries": _teller[klasse]["retry"],
+                "connection_errors": _teller[klasse]["feil"],
+                "http_503": _status[klasse]["503"],
+                "cache_hits": _teller[klasse]["cache_treff"],
+                "cache_revalidated": _teller[klasse]["revalidert"],
+                "memory_hits": _teller[klasse]["minnetreff"],
+                "coalesced": _teller[klasse]["sammenslått"],
+                "latency_ms": {
+                    "p50": _persentil(sortert, 50), "p95": _persentil(sortert, 95), "p99": _persentil(sortert, 99),
+                    "max": round(sortert[-1] * 1000, 1) if sortert else None,
+                    "histogram": _histogram(sortert),
+                },
+            }
+        faser = {navn: {"antall": t["antall"], "sekunder": round(t["sekunder"], 3),
+                        "herav_nett": round(t["herav_nett"], 3)} for navn, t in _faser.items()}
+
+    grunnlag = {
+        "script": sys.argv[0],
+        "argv": sys.argv[1:],
+        "started": _startet,
+        "wall_time_s": round(time.perf_counter() - _start, 3),
+    }
+    # Uten klienten (ingen nettkall i kjøringen) er det bare fasene å rapportere
+    klient = sys.modules.get("cristin_klient")
+    if klient is None:
+        return {**grunnlag, "phases": faser}
+
+    totalt = {felt: sum(e[felt] for e in endepunkter.values())
+              for felt in ("requests", "bytes", "retries", "http_503", "cache_hits", "cache_revalidated",
+                           "memory_hits", "coalesced")}
+    # sleep_s er summert over trådene, og kan derfor bli større enn veggtiden ved --concurrency > 1
+    return {
+        **grunnlag,
+        "totals": {**totalt, "sleep_s": round(klient._begrenser.sovet, 3),
+                   "failed_requests": len(klient.feilede_forespørsler),
+                   "final_rate": round(klient._begrenser.rate, 2)},
+        "endpoints": endepunkter,
+        "phases": faser,
+    }
+
+
+def skriv_rapport(filnavn, **ekstra):
+    if not filnavn:
+        return
+    with open(filnavn, "w", encoding="utf-8") as f:
+        json.dump({**rapport(), **ekstra}, f, ensure_ascii=False, indent=2)
+    print(f"📈 Kjørestatistikk lagret i {filnavn}")
+
+
+def legg_til_statistikkargument(parser):
+    parser.add_argument("--stats-file", metavar="FILE",
+                        help="Skriv JSON-rapport med kall per endepunkt, latenser, bytes og fasetider")
@@ -1,162 +1,227 @@
 import argparse
-import requests
-import pandas as pd
+import hashlib
 from datetime import datetime
-import time
 
-CRISTIN_API_BASE = "https://api.cristin.no/v2"
-
-
-def hent_med_retry(url, params=None, debug=False, max_retries=3, delay=3):
-    for attempt in range(max_retries):
-        if debug:
-            if params:
-                print(f"🔎 GET {url} | params={params}")
-            else:
-                print(f"🔎 GET {url}")
-
-        resp = requests.get(url, params=params)
-        if resp.status_code == 503:
-            print(f"⚠️  503 mottatt – prøver igjen om {delay} sekunder (forsøk {attempt + 1} av {max_retries})")
-            time.sleep(delay)
+import cristin_delta as delta
+import cristin_klient
+import cristin_kolonnelager as kolonnelager
+import cristin_poster as poster
+import cristin_referanse as referanse
+import cristin_statistikk as statistikk
+import samarbeid_analyse as samarbeid
+from cristin_journal import Journal
+from cristin_paginering import paginer_resultater, paginer_sider
+from cristin_planlegger import BULK_PARAMS, BULK_PER_PAGE, skriv_oppsummering, trenger_bidragsytere, trenger_detaljer
+from cristin_skrivere import skriv_rader
+from cristin_parallell import kjor_parallelt
+
+CRISTIN_API_BASE = cristin_klient.CRISTIN_API_BASE
+KOLONNER = ["Cristin Resultat-ID", "Tittel", "År", "Kategori", "Publiseringssted / Kanal", "NVI-nivå",
+            "Bidragsytere", "Resultat-URL", "Units"]
+
+
+def hent_med_retry(url, params=None, debug=False):
+    # Retry, backoff og rate-begrensning håndteres i den delte klienten
+    if debug:
+        if params:
+            print(f"🔎 GET {url} | params={params}")
         else:
-            return resp
-    return resp
+            print(f"🔎 GET {url}")
+    return cristin_klient.hent(url, params=params)
 
 
-def hent_publikasjoner_for_unit(unit_id, startaar, sluttaar, debug=False, lite=False):
-    print(f"Henter fra unit {unit_id} ({startaar} til {sluttaar})...")
-    side = 1
-    per_page = 100
-    alle_resultater = []
+def lag_rad(post, debug=False, lite=False, units=()):
+    resultat_id = post.resultat_id
 
-    while True:
+    if lite:
+        # Bare listeposten, uten ekstra kall
+        detaljer = post
+        contributors = [b.navn for b in post.bidragsytere]
+    else:
+        # Listeposten brukes direkte når den har alt vi trenger; ellers hentes detaljvisningen
+        detaljer = post
+        if trenger_detaljer(post):
+            detaljer_url = f"{CRISTIN_API_BASE}/results/{resultat_id}"
+            detaljer_resp = hent_med_retry(detaljer_url, debug=debug)
+            if detaljer_resp.status_code != 200:
+                return None
+            detaljer = poster.tolk_resultat(poster.les_json(detaljer_resp), post.aar)
+
+        # Contributors (fullt), fra forhåndsvisningen når den er komplett. Med --store trengs også
+        # affiliasjonene, slik at samarbeid_analyse.py --from-store har alt den bruker.
+        bidrag = post.bidragsytere
+        if trenger_bidragsytere(post, med_affiliasjoner=kolonnelager.er_aktiv()):
+            contributors_url = f"{CRISTIN_API_BASE}/results/{resultat_id}/contributors"
+            contrib_resp = hent_med_retry(contributors_url, debug=debug)
+            bidrag = poster.tolk_bidragsytere(poster.les_json(contrib_resp)) if contrib_resp.status_code == 200 else ()
+        kolonnelager.legg_til_bidragsytere(resultat_id, bidrag)
+        contributors = [f"{b.navn} (ID: {b.person_id})" if b.person_id else b.navn for b in bidrag]
+
+    for unit_id in units:
+        kolonnelager.legg_til("results", poster.lagerrad(detaljer, unit_id=unit_id))
+
+    return {
+        "Cristin Resultat-ID": resultat_id,
+        "Tittel": detaljer.tittel,
+        "År": post.aar,
+        "Kategori": detaljer.kategori,
+        "Publiseringssted / Kanal": detaljer.publiseringssted,
+        "NVI-nivå": detaljer.nvi,
+        "Bidragsytere": "; ".join(contributors),
+        "Resultat-URL": detaljer.url,
+        "Units": "; ".join(units),
+    }
+
+
+def kartlegg_units(unit_ids, startaar, sluttaar, hent):
+    # Lett gjennomgang av listene (uten fields=all) for å vite hvilke units hvert resultat hører til,
+    # slik at radene kan merkes med alle units før de skrives
+    units_per_resultat = {}
+    for unit_id in unit_ids:
         url = f"{CRISTIN_API_BASE}/units/{unit_id}/results"
-        params = {
-            "page": side,
-            "per_page": per_page,
-            "sort": "year_published",
-            "order": "desc"
-        }
-
-        resp = hent_med_retry(url, params=params, debug=debug)
-        if resp.status_code != 200:
-            print(f"❌ Feil ved kall til API (side {side}): {resp.status_code}")
-            break
-
-        resultater = resp.json()
-        if not resultater:
-            break
-
-        for pub in resultater:
-            try:
-                aar = int(pub.get("year_published", 0))
-            except:
-                continue
-
-            if not (startaar <= aar <= sluttaar):
-                continue
-
-            resultat_id = pub.get("cristin_result_id")
-
-            if lite:
-                tittel = pub.get("title", {}).get(pub.get("original_language", ""), "(Uten tittel)")
-                kategori = pub.get("category", {}).get("name", {}).get("en", "")
-                publiseringssted = (
-                    pub.get("channel", {}).get("title") or
-                    pub.get("journal", {}).get("name") or
-                    pub.get("publisher", {}).get("name") or
-                    pub.get("place") or
-                    pub.get("event", {}).get("name") or
-                    "Ukjent"
-                )
-                nvi = "-"
-                contributors = [
-                    f"{c.get('first_name', '')} {c.get('surname', '')}".strip()
-                    for c in pub.get("contributors", {}).get("preview", [])
-                ]
-                resultat_url = pub.get("url", "")
-            else:
-                detaljer_url = f"{CRISTIN_API_BASE}/results/{resultat_id}"
-                detaljer_resp = hent_med_retry(detaljer_url, debug=debug)
-                if detaljer_resp.status_code != 200:
-                    continue
-                detaljer = detaljer_resp.json()
-
-                tittel = detaljer.get("title", {}).get(detaljer.get("original_language", ""), "(Uten tittel)")
-                kategori = detaljer.get("category", {}).get("name", {}).get("en", "")
-
-                # NVI-nivå
-                nvi = "-"
-                journal = detaljer.get("journal", {})
-                if isinstance(journal, dict):
-                    nvi = journal.get("nvi_level") or journal.get("publisher", {}).get("nvi_level") or "-"
-
-                # Publiseringssted
-                publiseringssted = (
-                    detaljer.get("channel", {}).get("title") or
-                    detaljer.get("journal", {}).get("name") or
-                    detaljer.get("publisher", {}).get("name") or
-                    detaljer.get("place") or
-                    detaljer.get("event", {}).get("name") or
-                    "Ukjent"
-                )
-
-                # Contributors (fullt)
-                contributors_url = f"{CRISTIN_API_BASE}/results/{resultat_id}/contributors"
-                contrib_resp = hent_med_retry(contributors_url, debug=debug)
-                contributors = []
-                if contrib_resp.status_code == 200:
-                    for c in contrib_resp.json():
-                        navn = f"{c.get('first_name', '')} {c.get('surname', '')}".strip()
-                        cid = c.get("cristin_person_id", "")
-                        if cid:
-                            contributors.append(f"{navn} (ID: {cid})")
-                        else:
-                            contributors.append(navn)
-
-                resultat_url = detaljer.get("url", "")
-
-            alle_resultater.append({
-                "Cristin Resultat-ID": resultat_id,
-                "Tittel": tittel,
-                "År": aar,
-                "Kategori": kategori,
-                "Publiseringssted / Kanal": publiseringssted,
-                "NVI-nivå": nvi,
-                "Bidragsytere": "; ".join(contributors),
-                "Resultat-URL": resultat_url
-            })
-
-            time.sleep(0.1)  # Skånsom pacing mot API
-
-        side += 1
-
-    return alle_resultater
+        for post in paginer_resultater(url, startaar, sluttaar, hent=hent, per_page=BULK_PER_PAGE):
+            units_per_resultat.setdefault(post.resultat_id, []).append(unit_id)
+    return units_per_resultat
+
+
+def hent_publikasjoner_for_units(unit_ids, startaar, sluttaar, debug=False, lite=False, samtidighet=1,
+                                 journal=None, per_side=None):
+    hent = lambda u, params=None: hent_med_retry(u, params=params, debug=debug)
+    units_per_resultat = kartlegg_units(unit_ids, startaar, sluttaar, hent) if len(unit_ids) > 1 else {}
+
+    # Hvert resultat behandles én gang, under den første uniten det dukker opp i
+    sett = set()
+    for unit_id in unit_ids:
+        yield from hent_publikasjoner_for_unit(unit_id, startaar, sluttaar, debug, lite, samtidighet, journal,
+                                               sett, units_per_resultat, per_side=per_side)
+    if len(unit_ids) > 1:
+        treff = sum(len(units) for units in units_per_resultat.values())
+        print(f"🔁 {len(sett)} unike resultater fra {len(unit_ids)} units ({treff} treff i unit-listene)")
+
+
+def hent_publikasjoner_for_unit(unit_id, startaar, sluttaar, debug=False, lite=False, samtidighet=1, journal=None,
+                                sett=None, units_per_resultat=None, forste_side=1, siste_side=None, per_side=None):
+    # per_side kalles med de nye postene på hver side, slik at andre analyser kan gå i samme gjennomgang
+    # (se unit_rapport.py). Sider som leses fra journalen ved gjenopptak, kommer ikke med.
+    print(f"Henter fra unit {unit_id} ({startaar} til {sluttaar})...")
+    url = f"{CRISTIN_API_BASE}/units/{unit_id}/results"
+    hent = lambda u, params=None: hent_med_retry(u, params=params, debug=debug)
+    sett = set() if sett is None else sett
+    units_per_resultat = units_per_resultat or {}
+
+    # Ved gjenopptak hentes ferdige sider fra journalen (sidelinjen lister resultatene i rekkefølge, radene
+    # ligger under hvert resultat), og vi fortsetter fra første uferdige side
+    while journal is not None and journal.er_ferdig(f"{unit_id}:{forste_side}"):
+        for resultat_id in journal.rader(f"{unit_id}:{forste_side}"):
+            rad = journal.rader(_journalnokkel(resultat_id))[0]
+            sett.add(resultat_id)
+            delta.registrer(resultat_id, None, [rad])
+            yield rad
+        forste_side += 1
+    if siste_side is not None and forste_side > siste_side:
+        return
+
+    # Radene gis videre side for side, så bare én side om gangen holdes i minnet
+    # Fulle listeposter og store sider, se cristin_planlegger
+    for side, utvalgte in paginer_sider(url, startaar, sluttaar, hent=hent, per_page=BULK_PER_PAGE,
+                                        forste_side=forste_side, ekstra_params=BULK_PARAMS, siste_side=siste_side):
+        nye = []
+        for post in utvalgte:
+            if post.resultat_id not in sett:
+                sett.add(post.resultat_id)
+                nye.append((post, units_per_resultat.get(post.resultat_id, [unit_id])))
+        rader = _behandle_side(nye, debug, lite, samtidighet, journal)
+        if per_side is not None:
+            per_side([post for post, _ in nye])
+        if journal is not None:
+            journal.registrer(f"{unit_id}:{side}", [rad["Cristin Resultat-ID"] for rad in rader])
+        yield from rader
+
+
+def _journalnokkel(resultat_id):
+    return f"resultat:{resultat_id}"
+
+
+def _behandle_side(side, debug, lite, samtidighet, journal=None):
+    # Detaljer og bidragsytere hentes parallelt, rekkefølgen på radene beholdes.
+    # I deltamodus gjenbrukes radene for resultater som er uendret siden forrige kjøring.
+    # Hver ferdige rad journalføres med en gang, så et avbrudd midt på en side bare mister resultatene
+    # som var under arbeid; ved gjenopptak hoppes resultater som allerede står i journalen over.
+    def behandle(p):
+        post, units = p
+        nokkel = _journalnokkel(post.resultat_id)
+        if journal is not None and journal.er_ferdig(nokkel):
+            rad = journal.rader(nokkel)[0]
+            delta.registrer(post.resultat_id, None, [rad])
+            return rad
+        forrige = delta.gjenbruk(post.resultat_id, post.endret)
+        if forrige:
+            rad = {**forrige[0], "Units": "; ".join(units)}
+        else:
+            with statistikk.fase("tolking"):
+                rad = lag_rad(post, debug, lite, units)
+            if rad is not None:
+                delta.registrer(post.resultat_id, post.endret, [rad])
+        if rad is not None and journal is not None:
+            journal.registrer(nokkel, [rad], synk=False)
+        return rad
+
+    rader = kjor_parallelt(behandle, side, samtidighet)
+    return [rad for rad in rader if rad is not None]
 
 
 def lagre_resultater(resultater, filformat):
-    df = pd.DataFrame(resultater)
     navn = f"unit_publikasjoner_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{filformat}"
-    if filformat == "csv":
-        df.to_csv(navn, index=False)
-    else:
-        df.to_excel(navn, index=False)
-    print(f"✅ Lagret til {navn}")
+    antall = skriv_rader(resultater, navn, filformat, KOLONNER)
+    print(f"✅ Lagret {antall} resultater til {navn}")
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Hent Cristin-publikasjoner for en unit.")
-    parser.add_argument("--unit", required=True, help="Cristin Unit-ID, f.eks. 192.11.0.0")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hent Cristin-publikasjoner for en eller flere units.")
+    referanse.legg_til_unitargumenter(parser)
     parser.add_argument("--start", type=int, default=2015, help="Startår")
     parser.add_argument("--end", type=int, default=datetime.now().year, help="Sluttår")
     parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="Filformat")
     parser.add_argument("--debug", action="store_true", help="Skriv ut API-kall")
     parser.add_argument("--lite", action="store_true", help="Unngå ekstra detaljkall for raskere uthenting")
-    args = parser.parse_args()
-
-    data = hent_publikasjoner_for_unit(args.unit, args.start, args.end, args.debug, args.lite)
+    parser.add_argument("--resume", action="store_true", help="Fortsett en avbrutt kjøring fra journalen")
+    parser.add_argument("--journal", help="Journalfil for sjekkpunkter (standard avledes fra unit og år)")
+    kolonnelager.legg_til_lagerargumenter(parser)
+    delta.legg_til_deltaargumenter(parser, "snapshot_unit_<unit>_<start>_<end>.json.gz")
+    statistikk.legg_til_statistikkargument(parser)
+    cristin_klient.legg_til_http_argumenter(parser)
+    args = parser.parse_args(argv)
+    delta.sjekk_argumenter(parser, args)
+    cristin_klient.konfigurer_fra_args(args)
+    kolonnelager.aktiver(args.store, "unit")
+    referanse.aktiver(args.ref_index)
+    units = referanse.units_fra_args(args)
+
+    enheter = units[0] if len(units) == 1 else hashlib.sha1(" ".join(units).encode()).hexdigest()[:12]
+    endelse = f"{enheter}_{args.start}_{args.end}{'_lite' if args.lite else ''}"
+    journalfil = args.journal or f".journal_unit_{endelse}.jsonl"
+    journal = Journal(journalfil, gjenoppta=args.resume)
+    delta.aktiver(f"snapshot_unit_{endelse}.json.gz" if args.delta is True else args.delta,
+                  {"units": units, "start": args.start, "end": args.end, "lite": args.lite})
+
+    data = hent_publikasjoner_for_units(units, args.start, args.end, args.debug, args.lite,
+                                        cristin_klient.samtidighet, journal)
     lagre_resultater(data, args.format)
+    if args.store and not args.lite:
+        # Unitene og institusjonene affiliasjonene (og de høstede unitene) peker på, legges også i lageret
+        with statistikk.fase("oppslag"):
+            for unit_id in units:
+                samarbeid.hent_eget_universitetsnavn(unit_id)
+            samarbeid.slaa_opp_referanser(kolonnelager.affiliasjonsreferanser(), cristin_klient.samtidighet)
+    skriv_oppsummering()
+    delta.avslutt(args.changes or f"endringer_unit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", KOLONNER,
+                  feilet=bool(cristin_klient.feilede_forespørsler))
+    kolonnelager.avslutt()
+    referanse.avslutt()
+    # Ved feilede kall beholdes journalen, slik at kjøringen kan gjenopptas med --resume
+    journal.avslutt(slett=not cristin_klient.feilede_forespørsler)
+    statistikk.skriv_rapport(args.stats_file)
+    cristin_klient.avslutt()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,367 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Lokal stand-in for api.cristin.no med syntetiske data, for testing og benchmarking uten nett.
+# Start med f.eks. `python mock_cristin_server.py --port 8765` og kjør skriptene med
+# CRISTIN_API_BASE=http://127.0.0.1:8765/v2
+
+LAND = ["NO", "NO", "NO", "NO", "SE", "DK", "FI", "DE", "FR", "NL", "UK", "US", "CA", "CN", "JP", "AU", "BR", "ZA"]
+KATEGORIER = [
+    ("ARTICLE", "Academic article"),
+    ("ARTICLE", "Academic article"),
+    ("ARTICLE", "Academic article"),
+    ("ACADEMICREVIEW", "Academic literature review"),
+    ("CHAPTERACADEMIC", "Academic chapter/article/Conference paper"),
+    ("MONOGRAPHACA", "Academic monograph"),
+    ("ACADEMICLECTURE", "Academic lecture"),
+    ("DOCTORALDISSERTATION", "Doctoral dissertation"),
+    ("MEDIAINTERVIEW", "Interview"),
+]
+FORNAVN = ["Kari", "Ola", "Ingrid", "Lars", "Anne", "Per", "Silje", "Jonas", "Maria", "Erik", "Nora", "Henrik"]
+ETTERNAVN = ["Hansen", "Johansen", "Olsen", "Larsen", "Andersen", "Pedersen", "Nilsen", "Kristiansen", "Berg", "Haugen"]
+
+
+def lag_fixtures(antall_resultater=2000, antall_personer=60, antall_institusjoner=40, seed=42):
+    rnd = random.Random(seed)
+
+    institusjoner = {}
+    for i in range(1, antall_institusjoner + 1):
+        institusjoner[str(i)] = {
+            "cristin_institution_id": str(i),
+            "institution_name": {"en": f"University {i}", "nb": f"Universitet {i}"},
+            "country_code": "NO" if i == 1 else rnd.choice(LAND),
+        }
+
+    units = {}
+    for inst_id, inst in institusjoner.items():
+        rot = f"{inst_id}.0.0.0"
+        units[rot] = {"cristin_unit_id": rot, "unit_name": {"en": f"University {inst_id}"},
+                      "institution": {"cristin_institution_id": inst_id}, "country": inst["country_code"],
+                      "subunits": []}
+        for d in range(1, 4):
+            fakultet = f"{inst_id}.{d}.0.0"
+            units[fakultet] = {"cristin_unit_id": fakultet, "unit_name": {"en": f"Faculty {d}, University {inst_id}"},
+                               "institution": {"cristin_institution_id": inst_id}, "country": inst["country_code"],
+                               "parent_unit": {"cristin_unit_id": rot}, "subunits": []}
+            units[rot]["subunits"].append({"cristin_unit_id": fakultet})
+            for s in range(1, 3):
+                inst_unit = f"{inst_id}.{d}.{s}.0"
+                units[inst_unit] = {"cristin_unit_id": inst_unit,
+                                    "unit_name": {"en": f"Department {d}.{s}, University {inst_id}"},
+                                    "institution": {"cristin_institution_id": inst_id},
+                                    "country": inst["country_code"],
+                                    "parent_unit": {"cristin_unit_id": fakultet}, "subunits": []}
+                units[fakultet]["subunits"].append({"cristin_unit_id": inst_unit})
+
+    # Egne ansatte sitter ved institusjon 1, eksterne medforfattere spres over de andre
+    egne_units = [u for u in units if u.startswith("1.") and u.count(".0") == 1]
+    personer = {}
+    for i in range(antall_personer):
+        pid = str(100000 + i)
+        personer[pid] = {"cristin_person_id": pid, "first_name": rnd.choice(FORNAVN),
+                         "surname": f"{rnd.choice(ETTERNAVN)}{i}", "unit": rnd.choice(egne_units)}
+    eksterne_units = [u for u in units if not u.startswith("1.")]
+
+    resultater = {}
+    bidragsytere = {}
+    for i in range(1, antall_resultater + 1):
+        rid = str(2000000 + i)
+        kode, kategorinavn = rnd.choice(KATEGORIER)
+        pub = {
+            "cristin_result_id": rid,
+            "original_language": "en",
+            "title": {"en": f"Synthetic result {i}"},
+            "year_published": str(rnd.randint(2000, 2024)),
+            "category": {"code": kode, "name": {"en": kategorinavn}},
+            "created": {"date": "2024-01-01T00:00:00.000Z"},
+            "last_modified": {"date": f"2024-{rnd.randint(1, 12):02d}-01T00:00:00.000Z"},
+        }
+        if kode in ("ARTICLE", "ACADEMICREVIEW"):
+            pub["journal"] = {"name": f"Journal of Synthetic Studies {rnd.randint(1, 50)}",
+                              "nvi_level": rnd.choice(["1", "2", "0"]),
+                              "publisher": {"name": "Synthetic Press"}}
+        elif kode in ("MONOGRAPHACA", "CHAPTERACADEMIC"):
+            pub["publisher"] = {"name": f"Publisher {rnd.randint(1, 20)}", "nvi_level": rnd.choice(["1", "2"])}
+        elif kode == "ACADEMICLECTURE":
+            pub["event"] = {"name": f"Conference {rnd.randint(1, 30)}", "location": "Oslo"}
+        elif kode == "DOCTORALDISSERTATION":
+            pub["series"] = {"name": "Doctoral theses"}
+        else:
+            pub["media_type"] = {"code_name": {"en": "Newspaper"}}
+
+        deltakere = rnd.sample(list(personer), rnd.randint(1, 3))
+        bidrag = []
+        for pid in deltakere:
+            person = personer[pid]
+            bidrag.append({"cristin_person_id": pid, "first_name": person["first_name"],
+                           "surname": person["surname"], "affiliations": [{"unit_id": person["unit"]}]})
+        for _ in range(rnd.randint(0, 4)):
+            unit_id = rnd.choice(eksterne_units)
+            bidrag.append({"first_name": rnd.choice(FORNAVN), "surname": rnd.choice(ETTERNAVN),
+                           "affiliations": [{"unit_id": unit_id}]})
+        pub["contributors"] = {"count": len(bidrag)}
+        resultater[rid] = pub
+        bidragsytere[rid] = bidrag
+
+    return {"institusjoner": institusjoner, "units": units, "personer": personer,
+            "resultater": resultater, "bidragsytere": bidragsytere}
+
+
+class MockCristin:
+    def __init__(self, fixtures, latens=0.0, feilrate=0.0, seed=42):
+        self.f = fixtures
+        self.latens = latens
+        self.feilrate = feilrate
+        self.teller = Counter()
+        self._rnd = random.Random(seed)
+        self._lås = threading.Lock()
+
+        # Indekser for listeendepunktene
+        self.per_person = {pid: [] for pid in fixtures["personer"]}
+        self.per_unit = {uid: {} for uid in fixtures["units"]}  # dict som ordnet mengde
+        for rid, bidrag in fixtures["bidragsytere"].items():
+            for b in bidrag:
+                if "cristin_person_id" in b:
+                    self.per_person[b["cristin_person_id"]].append(rid)
+                unit_id = b["affiliations"][0]["unit_id"]
+                while unit_id:
+                    self.per_unit[unit_id][rid] = None
+                    unit_id = fixtures["units"][unit_id].get("parent_unit", {}).get("cristin_unit_id")
+
+    def nullstill(self):
+        with self._lås:
+            self.teller.clear()
+
+    def tell(self, *nokler, antall=1):
+        with self._lås:
+            for nokkel in nokler:
+                self.teller[nokkel] += antall
+
+    def skal_feile(self):
+        with self._lås:
+            return self._rnd.random() < self.feilrate
+
+    # === Serialisering med absolutte URL-er mot serveren selv
+    def unit_ref(self, base, unit_id):
+        return {"cristin_unit_id": unit_id, "url": f"{base}/units/{unit_id}"}
+
+    def inst_ref(self, base, inst_id):
+        return {"cristin_institution_id": inst_id, "url": f"{base}/institutions/{inst_id}"}
+
+    def resultat(self, base, rid, detalj=False):
+        pub = dict(self.f["resultater"][rid])
+        pub["url"] = f"{base}/results/{rid}"
+        bidrag = self.f["bidragsytere"][rid]
+        pub["contributors"] = {
+            "url": f"{base}/results/{rid}/contributors",
+            "count": len(bidrag),
+            "preview": [{k: b[k] for k in ("first_name", "surname", "cristin_person_id") if k in b}
+                        for b in bidrag[:5]],
+        }
+        if not detalj and "journal" in pub:
+            # Listevisningen mangler NVI-nivået, som i det ekte API-et
+            pub["journal"] = {k: v for k, v in pub["journal"].items() if k != "nvi_level"}
+        return pub
+
+    def bidragsytere(self, base, rid):
+        svar = []
+        for rekkefolge, b in enumerate(self.f["bidragsytere"][rid], start=1):
+            c = {k: v for k, v in b.items() if k != "affiliations"}
+            c["order"] = rekkefolge
+            c["affiliations"] = []
+            for a in b["affiliations"]:
+                unit = self.f["units"][a["unit_id"]]
+                inst_id = unit["institution"]["cristin_institution_id"]
+                c["affiliations"].append({"unit": self.unit_ref(base, a["unit_id"]),
+                                          "institution": self.inst_ref(base, inst_id)})
+            svar.append(c)
+        return svar
+
+    def unit(self, base, unit_id):
+        unit = dict(self.f["units"][unit_id])
+        unit["url"] = f"{base}/units/{unit_id}"
+        unit["institution"] = self.inst_ref(base, unit["institution"]["cristin_institution_id"])
+        if "parent_unit" in unit:
+            unit["parent_unit"] = self.unit_ref(base, unit["parent_unit"]["cristin_unit_id"])
+        unit["subunits"] = [self.unit_ref(base, s["cristin_unit_id"]) for s in unit["subunits"]]
+        return unit
+
+    def institusjon(self, base, inst_id):
+        inst = dict(self.f["institusjoner"][inst_id])
+        inst["url"] = f"{base}/institutions/{inst_id}"
+        inst["corresponding_unit"] = self.unit_ref(base, f"{inst_id}.0.0.0")
+        return inst
+
+    def resultatliste(self, base, ider, q):
+        # Paginering, sortering og filtrering som i /results
+        valgt = [self.f["resultater"][rid] for rid in ider]
+        if "published_since" in q:
+            valgt = [p for p in valgt if int(p["year_published"]) >= int(q["published_since"])]
+        if "published_before" in q:
+            valgt = [p for p in valgt if int(p["year_published"]) < int(q["published_before"])]
+        if "category" in q:
+            valgt = [p for p in valgt if p["category"]["code"] == q["category"]]
+        if q.get("sort", "").startswith("year_published"):
+            valgt.sort(key=lambda p: (int(p["year_published"]), p["cristin_result_id"]),
+                       reverse=q.get("order", "desc") == "desc")
+        side = int(q.get("page", 1))
+        per_page = min(int(q.get("per_page", 100)), 1000)
+        bit = valgt[(side - 1) * per_page: side * per_page]
+        detalj = q.get("fields") == "all"
+        return [self.resultat(base, p["cristin_result_id"], detalj) for p in bit], len(valgt)
+
+
+RUTER = [
+    (re.compile(r"/persons/?$"), "persons_liste"),
+    (re.compile(r"/persons/([^/]+)/results/?$"), "person_resultater"),
+    (re.compile(r"/persons/([^/]+)/?$"), "person"),
+    (re.compile(r"/units/([^/]+)/results/?$"), "unit_resultater"),
+    (re.compile(r"/units/?$"), "units_liste"),
+    (re.compile(r"/units/([^/]+)/?$"), "unit"),
+    (re.compile(r"/institutions/?$"), "institusjoner_liste"),
+    (re.compile(r"/institutions/([^/]+)/?$"), "institusjon"),
+    (re.compile(r"/results/([^/]+)/contributors/?$"), "bidragsytere"),
+    (re.compile(r"/results/([^/]+)/?$"), "resultat"),
+]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    mock = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        deler = urlsplit(self.path)
+        sti = re.sub(r"^/v2", "", deler.path)
+        q = {k: v[-1] for k, v in parse_qs(deler.query).items()}
+        base = f"http://{self.headers.get('Host')}/v2"
+
+        for monster, navn in RUTER:
+            treff = monster.match(sti)
+            if treff:
+                break
+        else:
+            return self.send_json(404, {"errors": ["Not found"]})
+
+        self.mock.tell("totalt", navn)
+        if self.mock.latens:
+            time.sleep(self.mock.latens)
+        if self.mock.skal_feile():
+            self.mock.tell("503")
+            return self.send_json(503, {"errors": ["Service unavailable"]}, {"Retry-After": "1"})
+
+        m = self.mock
+        f = m.f
+        arg = treff.group(1) if treff.groups() else None
+        headere = {}
+        if navn == "persons_liste":
+            side, per_page = int(q.get("page", 1)), int(q.get("per_page", 20))
+            alle = list(f["personer"].values())
+            data = [{k: p[k] for k in ("cristin_person_id", "first_name", "surname")}
+                    for p in alle[(side - 1) * per_page: side * per_page]]
+            headere["X-Total-Count"] = str(len(alle))
+        elif navn == "person":
+            if arg not in f["personer"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            p = f["personer"][arg]
+            data = {"cristin_person_id": arg, "first_name": p["first_name"], "surname": p["surname"],
+                    "affiliations": [{"unit": m.unit_ref(base, p["unit"])}]}
+        elif navn == "person_resultater":
+            if arg not in f["personer"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            data, totalt = m.resultatliste(base, m.per_person[arg], {**q, "per_page": q.get("per_page", 1000)})
+            headere["X-Total-Count"] = str(totalt)
+        elif navn == "unit_resultater":
+            if arg not in f["units"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            data, totalt = m.resultatliste(base, m.per_unit[arg], q)
+            headere["X-Total-Count"] = str(totalt)
+        elif navn in ("units_liste", "institusjoner_liste"):
+            kilde = f["units"] if navn == "units_liste" else f["institusjoner"]
+            lag = m.unit if navn == "units_liste" else m.institusjon
+            side, per_page = int(q.get("page", 1)), min(int(q.get("per_page", 20)), 1000)
+            ider = list(kilde)
+            data = [lag(base, i) for i in ider[(side - 1) * per_page: side * per_page]]
+            headere["X-Total-Count"] = str(len(ider))
+        elif navn == "unit":
+            if arg not in f["units"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            data = m.unit(base, arg)
+        elif navn == "institusjon":
+            if arg not in f["institusjoner"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            data = m.institusjon(base, arg)
+        elif navn == "bidragsytere":
+            if arg not in f["resultater"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            data = m.bidragsytere(base, arg)
+        else:
+            if arg not in f["resultater"]:
+                return self.send_json(404, {"errors": ["Not found"]})
+            data = m.resultat(base, arg, detalj=True)
+
+        self.send_json(200, data, headere)
+
+    def send_json(self, status, data, headere=None):
+        innhold = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        etag = f'"{hashlib.md5(innhold).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(innhold)))
+        if status == 200:
+            self.send_header("ETag", etag)
+        for k, v in (headere or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(innhold)
+        self.mock.tell("bytes", antall=len(innhold))
+
+
+def start_server(mock, port=0, vert="127.0.0.1"):
+    handler = type("MockHandler", (Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((vert, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokal mock av Cristin API-et med syntetiske data.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--results", type=int, default=2000, help="Antall syntetiske resultater")
+    parser.add_argument("--persons", type=int, default=60, help="Antall syntetiske personer")
+    parser.add_argument("--latency", type=float, default=0.0, help="Forsinkelse per kall (millisekunder)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Andel kall som får 503 (0–1)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    fixtures = lag_fixtures(args.results, args.persons, seed=args.seed)
+    mock = MockCristin(fixtures, args.latency / 1000, args.error_rate, args.seed)
+    server = start_server(mock, args.port)
+    print(f"🧪 Mock Cristin API på http://127.0.0.1:{server.server_port}/v2 – Ctrl+C for å stoppe")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"\n📊 {dict(mock.teller)}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
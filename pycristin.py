@@ -0,0 +1,74 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+
+# Felles inngang til verktøyene. Underkommandoen importerer modulen sin først når den kjøres, så
+# --help og små jobber starter raskt; pandas og openpyxl lastes bare av kommandoene som trenger dem.
+#
+#   python pycristin.py unit --unit 192.11.0.0 --lite
+#   python pycristin.py --api-base http://localhost:8799/v2 collab --unit 192.11.0.0
+#
+# Felles oppsett kan legges i pycristin.json (eller filen gitt med --config). Argumentene derfra legges
+# foran kommandolinjens egne, så det som står på kommandolinjen vinner:
+#
+#   {"api_base": "https://api.cristin.no/v2",
+#    "http": ["--concurrency", "4", "--cache-dir", ".cristin_cache"],
+#    "unit": ["--format", "xlsx"]}
+
+STANDARD_KONFIG = "pycristin.json"
+
+# kommando -> (modul, tar HTTP-argumenter, beskrivelse)
+KOMMANDOER = {
+    "persons": ("cristin_fetcher", True, "Hent publikasjoner for en liste personer"),
+    "unit": ("hent_unit_publikasjoner", True, "Hent publikasjoner for en eller flere units"),
+    "collab": ("samarbeid_analyse", True, "Analyser samarbeid for en eller flere units"),
+    "split": ("split_per_person_excel", False, "Lag én Excel-fil per person fra CSV eller kolonnelager"),
+    "refindex": ("cristin_referanse", False, "Lokal referanseindeks over units og institusjoner"),
+    "report": ("unit_rapport", True, "Eksport og samarbeidsstatistikk for units i én gjennomgang"),
+    "shard": ("cristin_koordinator", False, "Del en høsting i shards over flere prosesser eller maskiner"),
+}
+
+
+def les_konfig(filnavn):
+    if not filnavn or not os.path.exists(filnavn):
+        return {}
+    with open(filnavn, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="pycristin",
+        description="Høsting og analyse av Cristin-data.",
+        epilog="Kommandoer:\n" + "\n".join(f"  {navn:<10} {beskrivelse}"
+                                           for navn, (_, _, beskrivelse) in KOMMANDOER.items())
+               + "\n\nSe 'pycristin KOMMANDO --help' for argumentene til hver kommando.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--config", default=STANDARD_KONFIG, help=f"Felles oppsett (standard: {STANDARD_KONFIG})")
+    parser.add_argument("--api-base", help="Base-URL for API-et (standard: CRISTIN_API_BASE eller api.cristin.no)")
+    parser.add_argument("kommando", choices=KOMMANDOER, metavar="KOMMANDO", help="Se listen under")
+    parser.add_argument("argumenter", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    konfig = les_konfig(args.config)
+    api_base = args.api_base or konfig.get("api_base")
+    if api_base:
+        # Leses av cristin_klient ved import, derfor settes den før modulen importeres
+        os.environ["CRISTIN_API_BASE"] = api_base
+
+    modulnavn, tar_http, _ = KOMMANDOER[args.kommando]
+    forhand = (konfig.get("http", []) if tar_http else []) + konfig.get(args.kommando, [])
+    if "-h" in args.argumenter or "--help" in args.argumenter:
+        forhand = []
+
+    # Brukes av argparse (prog) og kjørerapporten i verktøyet
+    sys.argv = [f"pycristin {args.kommando}"] + forhand + args.argumenter
+    modul = importlib.import_module(modulnavn)
+    return modul.main(forhand + args.argumenter)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
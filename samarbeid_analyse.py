@@ -1,11 +1,18 @@
-import requests
 import argparse
-from collections import defaultdict, Counter
+import threading
+from collections import Counter
 from datetime import datetime
-import pandas as pd
-import time
 
-CRISTIN_API_BASE = "https://api.cristin.no/v2"
+import cristin_klient
+import cristin_kolonnelager as kolonnelager
+import cristin_poster as poster
+import cristin_referanse as referanse
+import cristin_statistikk as statistikk
+from cristin_paginering import paginer_sider
+from cristin_parallell import kjor_parallelt
+from cristin_planlegger import BULK_PARAMS, BULK_PER_PAGE, skriv_oppsummering, trenger_bidragsytere
+
+CRISTIN_API_BASE = cristin_klient.CRISTIN_API_BASE
 
 kontinent_mapping = {
     "Africa": ["DZ", "AO", "EG", "ET", "KE", "NG", "ZA", "TZ", "UG", "ZM", "ZW"],
@@ -20,153 +27,318 @@ land_til_kontinent = {kode: kontinent for kontinent, koder in kontinent_mapping.
 
 PEER_REVIEWED_CATEGORIES = {"ARTICLE", "ACADEMICREVIEW", "ARTICLEJOURNAL"}
 
-def hent_med_retry(url):
-    for _ in range(3):
-        resp = requests.get(url)
-        if resp.status_code == 503:
-            time.sleep(2)
-        else:
-            return resp
-    return resp
-
-def hent_publikasjoner(unit_id, start_year, end_year):
-    page = 1
-    results = []
-    while True:
-        url = f"{CRISTIN_API_BASE}/units/{unit_id}/results?page={page}&per_page=100"
-        resp = hent_med_retry(url)
-        if resp.status_code != 200:
-            break
-        data = resp.json()
-        if not data:
-            break
-        for entry in data:
-            year = int(entry.get("year_published", 0))
-            cat_code = entry.get("category", {}).get("code", "")
-            if start_year <= year <= end_year and cat_code in PEER_REVIEWED_CATEGORIES:
-                results.append(entry)
-        page += 1
-    return results
-
-def hent_landkode_og_navn(unit):
-    if not unit:
-        return None, None
-    unit_url = unit.get("url")
-    if unit_url:
-        resp = hent_med_retry(unit_url)
-        if resp.status_code == 200:
-            data = resp.json()
-            landkode = data.get("country")
-            inst = data.get("institution", {})
-            if inst:
-                inst_url = inst.get("url")
-                inst_resp = hent_med_retry(inst_url)
-                if inst_resp.status_code == 200:
-                    inst_data = inst_resp.json()
-                    navn = inst_data.get("institution_name", {}).get("en") or inst_data.get("institution_name", {}).get("nb")
-                    return landkode, navn
-    return None, None
-
-def hent_inst_landkode_og_navn(inst):
-    if not inst:
-        return None, None
-    inst_url = inst.get("url")
-    if inst_url:
-        resp = hent_med_retry(inst_url)
-        if resp.status_code == 200:
-            data = resp.json()
-            landkode = data.get("country_code")
-            navn = data.get("institution_name", {}).get("en") or data.get("institution_name", {}).get("nb")
-            return landkode, navn
-    return None, None
+def hent_med_retry(url, params=None):
+    # Retry, backoff og rate-begrensning håndteres i den delte klienten
+    return cristin_klient.hent(url, params=params)
+
+def hent_publikasjoner(unit_ids, start_year, end_year, samtidighet=1, bidragsytere=None):
+    # Resultater som hører til flere av unitene telles én gang.
+    # Med bidragsytere (dict) hentes bidragsyterne for hver side mens neste side lastes ned.
+    results = {}
+    for unit_id in unit_ids:
+        url = f"{CRISTIN_API_BASE}/units/{unit_id}/results"
+        for _, side in paginer_sider(url, start_year, end_year, PEER_REVIEWED_CATEGORIES, hent=hent_med_retry,
+                                     per_page=BULK_PER_PAGE, ekstra_params=BULK_PARAMS):
+            nye = []
+            for post in side:
+                kolonnelager.legg_til("results", poster.lagerrad(post, unit_id=unit_id))
+                if post.resultat_id not in results:
+                    results[post.resultat_id] = post
+                    nye.append(post)
+            if bidragsytere is not None:
+                with statistikk.fase("bidragsytere"):
+                    funn = kjor_parallelt(hent_affiliasjoner, nye, samtidighet)
+                bidragsytere.update((p.resultat_id, personer) for p, personer in zip(nye, funn))
+    return list(results.values())
+
+def hent_publikasjoner_fra_lager(katalog, unit_ids, start_year, end_year):
+    filter_ = (kolonnelager.aarsfilter(start_year, end_year) & kolonnelager.felt("unit_id").isin(unit_ids)
+               & kolonnelager.felt("kategori_kode").isin(sorted(PEER_REVIEWED_CATEGORIES)))
+    df = kolonnelager.les_tabell("results", katalog, kolonner=["cristin_result_id", "aar"], filter=filter_)
+    df = df.drop_duplicates("cristin_result_id")
+    return [poster.Resultat(rid, aar) for rid, aar in zip(df["cristin_result_id"], df["aar"])]
+
+def _fyll_oppslag(units, institusjoner):
+    # units: (unit_id, landkode, institution_id), institusjoner: (institution_id, landkode, navn)
+    for inst_id, landkode, navn in institusjoner:
+        _inst_cache[inst_id] = (landkode, navn)
+    for unit_id, landkode, inst_id in units:
+        inst = {"cristin_institution_id": inst_id, "url": f"{CRISTIN_API_BASE}/institutions/{inst_id}"} if inst_id else {}
+        _unit_cache[unit_id] = (landkode, inst)
+
+def last_oppslag_fra_lager(katalog):
+    # Fyller oppslagscachene fra lageret, så bare ukjente units/institusjoner går mot API-et
+    _fyll_oppslag(kolonnelager.les_tabell("units", katalog, kolonner=["unit_id", "landkode", "institution_id"])
+                  .itertuples(index=False, name=None),
+                  kolonnelager.les_tabell("institutions", katalog, kolonner=["institution_id", "landkode", "navn"])
+                  .itertuples(index=False, name=None))
+
+def last_oppslag_fra_indeks(indeks):
+    # Som over, men fra den nedlastede referanseindeksen (cristin_referanse.py refresh)
+    _fyll_oppslag(((uid, rad[referanse.UNIT_LAND], rad[referanse.UNIT_INST]) for uid, rad in indeks.units.items()),
+                  ((iid, rad[referanse.INST_LAND], rad[referanse.INST_NAVN]) for iid, rad in indeks.institutions.items()))
+
+def bidragsytere_i_lager(katalog, result_ids):
+    # Resultatene lageret har bidragsyterne til; de har alle affiliasjonene sine i lageret (også ingen)
+    df = kolonnelager.les_tabell("contributors", katalog, kolonner=["cristin_result_id"],
+                                 filter=kolonnelager.felt("cristin_result_id").isin(result_ids))
+    return set(df["cristin_result_id"])
+
+def affiliasjoner_fra_lager(katalog, result_ids):
+    # Affiliations-tabellen fra lageret, i samme form som affiliasjonsrader()
+    import pandas as pd
+
+    df = kolonnelager.les_tabell("affiliations", katalog, kolonner=["cristin_result_id", "unit_id", "institution_id"],
+                                 filter=kolonnelager.felt("cristin_result_id").isin(result_ids))
+    return pd.DataFrame({
+        "cristin_result_id": df["cristin_result_id"],
+        "unit_nokkel": df["unit_id"],
+        "unit_url": f"{CRISTIN_API_BASE}/units/" + df["unit_id"],
+        "inst_nokkel": df["institution_id"],
+        "inst_url": f"{CRISTIN_API_BASE}/institutions/" + df["institution_id"],
+    }, columns=AFFILIASJONSKOLONNER)
+
+# Oppslag av units og institusjoner deles over hele kjøringen, nøkkel er Cristin-ID
+_unit_cache = {}
+_inst_cache = {}
+oppslag_teller = Counter()
+_teller_lås = threading.Lock()
+
+def _tell(nokkel, antall=1):
+    # Oppslagene kjører i tråder (se kjor_parallelt), så telleren oppdateres under lås
+    with _teller_lås:
+        oppslag_teller[nokkel] += antall
+
+def _inst_navn(inst_data):
+    return inst_data.get("institution_name", {}).get("en") or inst_data.get("institution_name", {}).get("nb")
+
+# Oppslagene legges i kolonnelageret (én gang per kjøring), også når de kommer fra cachen eller indeksen
+def _lagre_unit(unit_id, verdi):
+    if verdi:
+        kolonnelager.legg_til("units", {"unit_id": unit_id, "landkode": verdi[0],
+                                        "institution_id": (verdi[1] or {}).get("cristin_institution_id")})
+
+def _lagre_inst(inst_id, verdi):
+    if verdi:
+        kolonnelager.legg_til("institutions", {"institution_id": inst_id, "landkode": verdi[0], "navn": verdi[1]})
+
+def _slaa_opp_unit(unit_id, unit_url):
+    if unit_id in _unit_cache:
+        _tell("unit_treff")
+        _lagre_unit(unit_id, _unit_cache[unit_id])
+        return _unit_cache[unit_id]
+    _tell("unit_bom")
+    verdi = None
+    resp = hent_med_retry(unit_url)
+    if resp.status_code == 200:
+        data = poster.les_json(resp)
+        verdi = (data.get("country"), data.get("institution", {}))
+        referanse.registrer_unit(data)
+        _lagre_unit(data.get("cristin_unit_id") or unit_id, verdi)
+    if resp.status_code < 500:  # Ikke husk forbigående serverfeil
+        _unit_cache[unit_id] = verdi
+    return verdi
+
+def _slaa_opp_inst(inst_id, inst_url):
+    if inst_id in _inst_cache:
+        _tell("inst_treff")
+        _lagre_inst(inst_id, _inst_cache[inst_id])
+        return _inst_cache[inst_id]
+    _tell("inst_bom")
+    verdi = None
+    resp = hent_med_retry(inst_url)
+    if resp.status_code == 200:
+        data = poster.les_json(resp)
+        verdi = (data.get("country_code"), _inst_navn(data))
+        referanse.registrer_institusjon(data)
+        _lagre_inst(data.get("cristin_institution_id") or inst_id, verdi)
+    if resp.status_code < 500:  # Ikke husk forbigående serverfeil
+        _inst_cache[inst_id] = verdi
+    return verdi
 
 def hent_eget_universitetsnavn(unit_id):
     url = f"{CRISTIN_API_BASE}/units/{unit_id}"
-    resp = hent_med_retry(url)
-    if resp.status_code != 200:
+    unit_data = _slaa_opp_unit(unit_id, url)
+    if not unit_data:
         return None
-    data = resp.json()
-    inst = data.get("institution", {})
+    inst = unit_data[1]
     if inst:
         inst_url = inst.get("url")
-        inst_resp = hent_med_retry(inst_url)
-        if inst_resp.status_code == 200:
-            inst_data = inst_resp.json()
-            navn = inst_data.get("institution_name", {}).get("en") or inst_data.get("institution_name", {}).get("nb")
-            return navn
+        inst_data = _slaa_opp_inst(inst.get("cristin_institution_id") or inst_url, inst_url)
+        if inst_data:
+            return inst_data[1]
     return None
 
-def analyser_samarbeid(publikasjoner, eget_universitet):
-    uten = 0
-    nasjonale = 0
-    internasjonale = 0
-    institusjoner = set()
-    institusjonsteller = Counter()
-    kontinent_teller = defaultdict(set)
-
-    for pub in publikasjoner:
-        result_id = pub.get("cristin_result_id")
-        contributors_url = f"{CRISTIN_API_BASE}/results/{result_id}/contributors"
+def hent_affiliasjoner(post):
+    # Bidragsyterne med affiliasjoner for ett resultat, eller None om de ikke kunne hentes
+    personer = post.bidragsytere
+    if trenger_bidragsytere(post, med_affiliasjoner=True):
+        contributors_url = f"{CRISTIN_API_BASE}/results/{post.resultat_id}/contributors"
         resp = hent_med_retry(contributors_url)
         if resp.status_code != 200:
-            continue
-        personer = resp.json()
-        landkoder = set()
-        inst_navn = set()
-
-        for p in personer:
-            affil = p.get("affiliations", [])
-            for a in affil:
-                unit = a.get("unit", {})
-                inst = a.get("institution", {})
-
-                ccu, nu = hent_landkode_og_navn(unit)
-                cci, ni = hent_inst_landkode_og_navn(inst)
-
-                if ccu:
-                    landkoder.add(ccu)
-                    if nu and nu != eget_universitet:
-                        inst_navn.add(nu)
-                elif cci:
-                    landkoder.add(cci)
-                    if ni and ni != eget_universitet:
-                        inst_navn.add(ni)
-
-        if not inst_navn:
-            uten += 1
-        elif landkoder == {"NO"}:
-            nasjonale += 1
-        else:
-            internasjonale += 1
-            for kode in landkoder:
-                kontinent = land_til_kontinent.get(kode, "Ukjent")
-                kontinent_teller[kode].add(result_id)
-            for navn in inst_navn:
-                institusjoner.add(navn)
-                institusjonsteller[navn] += 1
+            return None
+        personer = poster.tolk_bidragsytere(poster.les_json(resp))
+    kolonnelager.legg_til_bidragsytere(post.resultat_id, personer)
+    return personer
+
+AFFILIASJONSKOLONNER = ["cristin_result_id", "unit_nokkel", "unit_url", "inst_nokkel", "inst_url"]
+
+def affiliasjonsrader(result_id, personer):
+    # Én rad per affiliasjon; nøkkelen er Cristin-ID, eller URL-en når ID mangler
+    for p in personer:
+        for a in p.affiliasjoner or ():
+            yield _affiliasjonsrad(result_id, a)
+
+def _affiliasjonsrad(result_id, a):
+    return (result_id,
+            (a.unit_id or a.unit_url) if a.unit_url else None, a.unit_url,
+            (a.inst_id or a.inst_url) if a.inst_url else None, a.inst_url)
+
+def slaa_opp_referanser(referanser, samtidighet=1):
+    # Slår opp units og institusjoner som affiliasjonene peker på, så de havner i kolonnelageret
+    # (se cristin_kolonnelager.affiliasjonsreferanser); brukes av høsteren med --store
+    import pandas as pd
+
+    rader = [_affiliasjonsrad(None, poster.Affiliasjon(*ref)) for ref in referanser]
+    slaa_opp_affiliasjoner(pd.DataFrame(rader, columns=AFFILIASJONSKOLONNER), samtidighet)
+
+def _slaa_opp_alle(oppslag, nokler_og_urler, samtidighet, treff):
+    # Hver unike unit/institusjon slås opp én gang, uansett hvor mange affiliasjoner som peker på den.
+    # Referansene som faller bort i dedupliseringen, besvares av det ene oppslaget og telles som treff.
+    nokler_og_urler = list(nokler_og_urler)
+    par = list(dict(nokler_og_urler).items())
+    if len(nokler_og_urler) > len(par):
+        _tell(treff, len(nokler_og_urler) - len(par))
+    return dict(zip((n for n, _ in par), kjor_parallelt(lambda p: oppslag(*p), par, samtidighet)))
+
+def slaa_opp_affiliasjoner(affil, samtidighet=1):
+    # Legger til landkode og institusjonsnavn per affiliasjon. Som før brukes unitens land og institusjon
+    # når de finnes, ellers institusjonen oppgitt direkte på affiliasjonen.
+    units = affil[["unit_nokkel", "unit_url"]].dropna()
+    unit_data = _slaa_opp_alle(_slaa_opp_unit, zip(units["unit_nokkel"], units["unit_url"]), samtidighet,
+                              "unit_treff")
+    unit_land = {k: v[0] for k, v in unit_data.items() if v and v[1]}
+    unit_inst = {k: (v[1].get("cristin_institution_id") or v[1].get("url"), v[1].get("url"))
+                 for k, v in unit_data.items() if v and v[1]}
+
+    direkte = affil[["inst_nokkel", "inst_url"]].dropna()
+    institusjoner = list(zip(direkte["inst_nokkel"], direkte["inst_url"])) + [i for i in unit_inst.values() if i[1]]
+    inst_data = {k: v for k, v in _slaa_opp_alle(_slaa_opp_inst, institusjoner, samtidighet,
+                                                               "inst_treff").items() if v}
+
+    unit_inst_nokkel = affil["unit_nokkel"].map({k: v[0] for k, v in unit_inst.items()})
+    u_land = affil["unit_nokkel"].map(unit_land).where(unit_inst_nokkel.isin(inst_data.keys()))
+    u_navn = unit_inst_nokkel.map({k: v[1] for k, v in inst_data.items()})
+    i_land = affil["inst_nokkel"].map({k: v[0] for k, v in inst_data.items()})
+    i_navn = affil["inst_nokkel"].map({k: v[1] for k, v in inst_data.items()})
+
+    fra_unit = u_land.fillna("").astype(bool)
+    fra_inst = ~fra_unit & i_land.fillna("").astype(bool)
+    return affil.assign(
+        landkode=u_land.where(fra_unit, i_land.where(fra_inst)),
+        institusjon=u_navn.where(fra_unit, i_navn.where(fra_inst)),
+    )
+
+def beregn_statistikk(artikler, affil, egne_institusjoner):
+    import numpy as np
+    import pandas as pd
+
+    affil = affil[affil["cristin_result_id"].isin(artikler["cristin_result_id"])].copy()
+    affil["ekstern"] = affil["institusjon"].notna() & ~affil["institusjon"].isin(egne_institusjoner)
+    affil["utenlandsk"] = affil["landkode"].notna() & (affil["landkode"] != "NO")
+
+    # Klassifisering per artikkel: uten partnere, kun norske land, ellers internasjonal
+    per_artikkel = affil.groupby("cristin_result_id").agg(
+        partner=("ekstern", "any"), har_land=("landkode", "count"), utenlandsk=("utenlandsk", "any"))
+    per_artikkel = per_artikkel.reindex(artikler["cristin_result_id"].unique(), fill_value=False)
+    klasse = pd.Series(np.select([~per_artikkel["partner"], (per_artikkel["har_land"] > 0) & ~per_artikkel["utenlandsk"]],
+                                 ["uten", "nasjonal"], "internasjonal"), index=per_artikkel.index)
+    antall = klasse.value_counts()
+
+    internasjonale = affil[affil["cristin_result_id"].isin(klasse.index[klasse == "internasjonal"])]
+    land = internasjonale[["cristin_result_id", "landkode"]].dropna().drop_duplicates()
+    kontinent = land.assign(kontinent=land["landkode"].map(land_til_kontinent).fillna("Ukjent"))
+    partnere = internasjonale.loc[internasjonale["ekstern"], ["cristin_result_id", "institusjon"]].drop_duplicates()
 
     return {
-        "uten": uten,
-        "nasjonale": nasjonale,
-        "internasjonale": internasjonale,
-        "institusjonsteller": institusjonsteller,
-        "kontinent_teller": {k: len(v) for k, v in kontinent_teller.items()},
-        "antall_institusjoner": len(institusjoner)
+        "uten": int(antall.get("uten", 0)),
+        "nasjonale": int(antall.get("nasjonal", 0)),
+        "internasjonale": int(antall.get("internasjonal", 0)),
+        "institusjonsteller": partnere["institusjon"].value_counts(),
+        "land_teller": land["landkode"].value_counts(),
+        "kontinent_teller": kontinent.drop_duplicates(["cristin_result_id", "kontinent"])["kontinent"].value_counts(),
+        "antall_institusjoner": partnere["institusjon"].nunique(),
     }
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--unit", required=True)
-    parser.add_argument("--start", type=int, default=2018)
-    parser.add_argument("--end", type=int, default=2024)
-    args = parser.parse_args()
+def samforfatterkanter(affil):
+    # Institusjonspar som står på samme artikkel, vektet med antall felles artikler
+    # Parene dannes på heltallskoder (sortert etter navn), som er langt raskere enn å slå sammen strenger
+    import pandas as pd
 
-    pub = hent_publikasjoner(args.unit, args.start, args.end)
-    print(f"🔍 Antall peer reviewed publikasjoner funnet: {len(pub)}")
+    inst = affil[["cristin_result_id", "institusjon"]].dropna()
+    koder, navn = pd.factorize(inst["institusjon"], sort=True)
+    inst = pd.DataFrame({"artikkel": pd.factorize(inst["cristin_result_id"])[0], "a": koder}).drop_duplicates()
+    par = inst.merge(inst.rename(columns={"a": "b"}), on="artikkel")
+    par = par[par["a"] < par["b"]]
+    kanter = par.groupby(["a", "b"]).size().rename("artikler").reset_index()
+    kanter = kanter.sort_values(["artikler", "a", "b"], ascending=[False, True, True])
+    return pd.DataFrame({"institusjon_a": navn[kanter["a"]], "institusjon_b": navn[kanter["b"]],
+                         "artikler": kanter["artikler"].to_numpy()})
+
+def institusjon_aar_matrise(affil, artikler, egne_institusjoner):
+    # Antall artikler per samarbeidende institusjon og år
+    inst = affil.loc[~affil["institusjon"].isin(egne_institusjoner), ["cristin_result_id", "institusjon"]].dropna()
+    inst = inst.drop_duplicates().merge(artikler, on="cristin_result_id")
+    return inst.groupby(["institusjon", "aar"]).size().unstack(fill_value=0)
+
+def analyser_samarbeid(publikasjoner, egne_institusjoner, samtidighet=1, lager=None, bidragsytere=None,
+                       kanter=False, matrise=False):
+    # pandas importeres først her, så --help og oppstart går raskt
+    import pandas as pd
+
+    # Eksplisitt dtype: en tom liste ville ellers gitt float64, og sammenslåingene mot affiliasjonene feiler
+    artikler = pd.DataFrame({
+        "cristin_result_id": pd.Series([p.resultat_id for p in publikasjoner], dtype=object),
+        "aar": pd.to_numeric(pd.Series([p.aar for p in publikasjoner], dtype=object),
+                             errors="coerce").astype("Int64"),
+    })
+
+    # Med lager hentes affiliasjonene fra kolonnelageret; resultater som mangler der hentes fra API-et.
+    # Bidragsytere som allerede ble hentet side for side under listingen (se hent_publikasjoner) gjenbrukes.
+    bidragsytere = bidragsytere or {}
+    deler = []
+    mangler = publikasjoner
+    if lager:
+        resultat_ids = artikler["cristin_result_id"].tolist()
+        fra_lager = affiliasjoner_fra_lager(lager, resultat_ids)
+        deler.append(fra_lager)
+        funnet = set(fra_lager["cristin_result_id"]) | bidragsytere_i_lager(lager, resultat_ids)
+        mangler = [p for p in publikasjoner if p.resultat_id not in funnet]
+
+    with statistikk.fase("bidragsytere"):
+        per_artikkel = kjor_parallelt(
+            lambda p: bidragsytere[p.resultat_id] if p.resultat_id in bidragsytere
+            else hent_affiliasjoner(p), mangler, samtidighet)
+    feilet = {p.resultat_id for p, personer in zip(mangler, per_artikkel) if personer is None}
+    deler.append(pd.DataFrame(
+        [rad for p, personer in zip(mangler, per_artikkel) if personer is not None
+         for rad in affiliasjonsrader(p.resultat_id, personer)],
+        columns=AFFILIASJONSKOLONNER))
 
-    eget_universitet = hent_eget_universitetsnavn(args.unit)
-    stats = analyser_samarbeid(pub, eget_universitet)
+    artikler = artikler[~artikler["cristin_result_id"].isin(feilet)]
+    with statistikk.fase("oppslag"):
+        affil = slaa_opp_affiliasjoner(pd.concat(deler, ignore_index=True), samtidighet)
 
+    with statistikk.fase("analyse"):
+        stats = beregn_statistikk(artikler, affil, egne_institusjoner)
+        # Kantlisten og matrisen bygges bare når de skal skrives (--edges/--matrix)
+        if kanter:
+            stats["kanter"] = samforfatterkanter(affil)
+        if matrise:
+            stats["matrise"] = institusjon_aar_matrise(affil, artikler, egne_institusjoner)
+    return stats
+
+def skriv_samarbeid(stats, top=10, kanter=None, matrise=None):
     print("\n📊 Oppsummering av samarbeid:")
     print(f"Uten samarbeidspartnere: {stats['uten']}")
     print(f"Kun nasjonale samarbeidspartnere: {stats['nasjonale']}")
@@ -177,10 +349,68 @@ def main():
     for k, v in stats['kontinent_teller'].items():
         print(f"{k}: {v} artikler")
 
-    print("\n🏫 Topp 10 samarbeidende institusjoner:")
-    for navn, ant in stats['institusjonsteller'].most_common(10):
+    print(f"\n🗺️  Topp {top} land:")
+    for k, v in stats['land_teller'].head(top).items():
+        print(f"{k}: {v} artikler")
+
+    print(f"\n🏫 Topp {top} samarbeidende institusjoner:")
+    for navn, ant in stats['institusjonsteller'].head(top).items():
         print(f"{navn}: {ant}")
 
+    with statistikk.fase("skriving"):
+        if kanter:
+            stats['kanter'].to_csv(kanter, index=False)
+            print(f"\n✅ {len(stats['kanter'])} samforfatterkanter lagret i {kanter}")
+        if matrise:
+            stats['matrise'].to_csv(matrise)
+            print(f"✅ Institusjon×år-matrise ({stats['matrise'].shape[0]} institusjoner) lagret i {matrise}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    referanse.legg_til_unitargumenter(parser)
+    parser.add_argument("--start", type=int, default=2018)
+    parser.add_argument("--end", type=int, default=2024)
+    parser.add_argument("--top", type=int, default=10, help="Antall institusjoner og land i utskriften")
+    parser.add_argument("--edges", help="Skriv samforfatterkanter (institusjonspar) til denne CSV-filen")
+    parser.add_argument("--matrix", help="Skriv institusjon×år-matrisen til denne CSV-filen")
+    kolonnelager.legg_til_lagerargumenter(parser)
+    kolonnelager.legg_til_lagerargumenter(parser, lese=True)
+    statistikk.legg_til_statistikkargument(parser)
+    cristin_klient.legg_til_http_argumenter(parser)
+    args = parser.parse_args(argv)
+    cristin_klient.konfigurer_fra_args(args)
+    kolonnelager.aktiver(args.store, "collab")
+    indeks = referanse.aktiver(args.ref_index)
+    if indeks is not None:
+        last_oppslag_fra_indeks(indeks)
+    units = referanse.units_fra_args(args)
+
+    bidragsytere = {}
+    with statistikk.fase("liste"):
+        if args.from_store:
+            last_oppslag_fra_lager(args.from_store)
+            pub = hent_publikasjoner_fra_lager(args.from_store, units, args.start, args.end)
+        else:
+            pub = hent_publikasjoner(units, args.start, args.end, cristin_klient.samtidighet, bidragsytere)
+    print(f"🔍 Antall peer reviewed publikasjoner funnet: {len(pub)}")
+
+    # Samarbeid innad i egne institusjoner regnes ikke som eksternt samarbeid
+    egne_institusjoner = {navn for navn in map(hent_eget_universitetsnavn, units) if navn}
+    stats = analyser_samarbeid(pub, egne_institusjoner, cristin_klient.samtidighet, args.from_store, bidragsytere,
+                               kanter=bool(args.edges), matrise=bool(args.matrix))
+
+    skriv_samarbeid(stats, args.top, args.edges, args.matrix)
+
+    print(f"\n🧠 Oppslag: units {oppslag_teller['unit_treff']} treff / {oppslag_teller['unit_bom']} bom, "
+          f"institusjoner {oppslag_teller['inst_treff']} treff / {oppslag_teller['inst_bom']} bom")
+    skriv_oppsummering()
+    kolonnelager.avslutt()
+    referanse.avslutt()
+    statistikk.skriv_rapport(args.stats_file, oppslag=dict(oppslag_teller),
+                             artikler={"uten": stats["uten"], "nasjonale": stats["nasjonale"],
+                                       "internasjonale": stats["internasjonale"]})
+    cristin_klient.avslutt()
+
 if __name__ == "__main__":
     main()
 
@@ -1,14 +1,20 @@
-import pandas as pd
+import argparse
+import hashlib
+import json
 import os
-from openpyxl import load_workbook, Workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.worksheet.datavalidation import DataValidation
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cristin_kolonnelager as kolonnelager
+import cristin_statistikk as statistikk
 
 # === KONFIGURASJON ===
 INPUT_CSV = "cristin_publikasjoner_kategoriadaptiv.csv"
 OUTPUT_DIR = "excel_per_person"
+MANIFEST = ".manifest.json"
+
+# Kolonner som fylles ut av de som går gjennom filene, og som ikke skal overskrives
+MERKNADSKOLONNER = ["Kategori", "Type", "Kommentar", "Awards etc."]
 
 kategori_valg = ["Basic or Discovery", "Applied or Integration", "Teaching and Learning", "N/A"]
 type_valg = ["Peer reviewed journal articles", "Additional peer- or editorial reviewed ICs", "All other ICs"]
@@ -22,57 +28,132 @@ hjelpetekst = (
     "• Teaching and Learning Scholarship explores the theory and methods of teaching and advances new understandings, insights, content, and methods that impact learning behavior."
 )
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Kolonnene i CSV-en fra cristin_fetcher.py, med tilsvarende kolonne i kolonnelagerets results-tabell
+LAGERKOLONNER = {
+    "Cristin-ID": "person_id",
+    "Navn": "person_navn",
+    "Tittel": "tittel",
+    "År": "aar",
+    "Kategori": "kategori",
+    "Publiseringssted / Kanal": "publiseringssted",
+    "Media type": "media_type",
+    "NVI-nivå": "nvi_niva",
+    "Resultat-URL": "url",
+    "Cristin Resultat-ID": "cristin_result_id",
+    "Kanal-kilde (debug)": "kanal_kilde",
+}
+
+
+def les_fra_lager(katalog, startaar=None, sluttaar=None):
+    filter_ = kolonnelager.felt("person_id").is_valid()
+    aar = kolonnelager.aarsfilter(startaar, sluttaar)
+    if aar is not None:
+        filter_ = filter_ & aar
+    df = kolonnelager.les_tabell("results", katalog, kolonner=list(LAGERKOLONNER.values()), filter=filter_)
+    return df.rename(columns={v: k for k, v in LAGERKOLONNER.items()})
+
+
+def les_og_klargjor(input_csv):
+    import pandas as pd
+
+    return klargjor(pd.read_csv(input_csv))
+
 
-# === Les CSV ===
-df = pd.read_csv(INPUT_CSV)
+def klargjor(df):
+    # Legg til tomme kolonner
+    df["Kategori"] = ""
+    df["Type"] = ""
+    df["Kommentar"] = ""
+    df["Awards etc."] = ""
 
-# Legg til tomme kolonner
-df["Kategori"] = ""
-df["Type"] = ""
-df["Kommentar"] = ""
-df["Awards etc."] = ""
+    # Reorganiser kolonnene og fjern uønskede
+    kolonner = list(df.columns)
+    kolonner = [k for k in kolonner if k not in ["Cristin-ID", "kanal-kilde"]]
 
-# Reorganiser kolonnene og fjern uønskede
-kolonner = list(df.columns)
-kolonner = [k for k in kolonner if k not in ["Cristin-ID", "kanal-kilde"]]
+    if "Kategori" in kolonner and "Type" in kolonner:
+        kolonner.remove("Kategori")
+        type_index = kolonner.index("Type")
+        kolonner.insert(type_index, "Kategori")
 
-if "Kategori" in kolonner and "Type" in kolonner:
-    kolonner.remove("Kategori")
-    type_index = kolonner.index("Type")
-    kolonner.insert(type_index, "Kategori")
+    return df[kolonner]
 
-df = df[kolonner]
 
-# === Gruppér per person og lag Excel-filer ===
-for navn, gruppe in df.groupby("Navn"):
+def filnavn_for(navn, output_dir):
     navn_deler = navn.strip().split()
     etternavn = navn_deler[-1] if len(navn_deler) >= 2 else navn
     fornavn = " ".join(navn_deler[:-1]) if len(navn_deler) >= 2 else ""
     safe_navn = f"{etternavn}, {fornavn}".strip().replace("/", "_").replace("\\", "_")
-    filnavn = f"{OUTPUT_DIR}/publikasjoner - {safe_navn}.xlsx"
+    return f"{output_dir}/publikasjoner - {safe_navn}.xlsx"
+
+
+def innholdshash(kolonner, rader):
+    return hashlib.sha256(json.dumps([kolonner, rader], default=str).encode("utf-8")).hexdigest()
+
+
+def les_merknader(filnavn, data_start_row=11):
+    # Leser eksisterende merknader per Cristin Resultat-ID fra en tidligere generert fil
+    from openpyxl import load_workbook
+
+    wb = load_workbook(filnavn, read_only=True)
+    ws = wb["Publikasjoner"]
+    rader = ws.iter_rows(min_row=data_start_row, values_only=True)
+    headers = list(next(rader, ()))
+    merknader = {}
+    if "Cristin Resultat-ID" in headers:
+        id_idx = headers.index("Cristin Resultat-ID")
+        for row in rader:
+            if all(v is None for v in row):
+                break
+            verdier = {k: row[headers.index(k)] for k in MERKNADSKOLONNER
+                       if k in headers and row[headers.index(k)] not in (None, "")}
+            if verdier:
+                merknader[str(row[id_idx])] = verdier
+    wb.close()
+    return merknader
+
+
+def flett_merknader(kolonner, rader, merknader):
+    id_idx = kolonner.index("Cristin Resultat-ID")
+    flettet = []
+    for row in rader:
+        verdier = merknader.get(str(row[id_idx]))
+        if verdier:
+            row = tuple(verdier.get(k, v) for k, v in zip(kolonner, row))
+        flettet.append(row)
+    return flettet
+
+
+def lag_arbeidsbok(filnavn, kolonner, rader, bevar_merknader=False):
+    # Kjøres i en egen prosess per person; returnerer filnavn og tidsbruk
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.datavalidation import DataValidation
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+
+    start = time.perf_counter()
+    if bevar_merknader and os.path.exists(filnavn) and "Cristin Resultat-ID" in kolonner:
+        rader = flett_merknader(kolonner, rader, les_merknader(filnavn))
 
     wb = Workbook()
     ws = wb.active
     ws.title = "Publikasjoner"
 
     # === 1: Hjelpetekst
-    ws.merge_cells(start_row=1, start_column=1, end_row=9, end_column=len(gruppe.columns))
+    ws.merge_cells(start_row=1, start_column=1, end_row=9, end_column=len(kolonner))
     cell = ws.cell(row=1, column=1)
     cell.value = hjelpetekst
     cell.alignment = Alignment(wrap_text=True, vertical="top")
 
-    # === 2: Skriv overskrifter og data fra rad 11
+    # === 2: Skriv overskrifter og data fra rad 11, med eksplisitte rad- og kolonnenumre
     data_start_row = 11
-    for col_idx, col_name in enumerate(gruppe.columns, start=1):
-        ws.cell(row=data_start_row, column=col_idx).value = str(col_name)
-
-    for row_idx, row in enumerate(gruppe.itertuples(index=False), start=data_start_row + 1):
-        for col_idx, value in enumerate(row, start=1):
-            ws.cell(row=row_idx, column=col_idx).value = value
+    headers = [str(k) for k in kolonner]
+    for r, verdier in enumerate([headers, *rader], start=data_start_row):
+        for c, verdi in enumerate(verdier, start=1):
+            ws.cell(row=r, column=c, value=verdi)
 
-    max_row = ws.max_row
-    max_col = ws.max_column
+    max_row = data_start_row + len(rader)
+    max_col = len(headers)
 
     # === 3: Excel-tabell
     col_letter_end = get_column_letter(max_col)
@@ -84,7 +165,6 @@ for navn, gruppe in df.groupby("Navn"):
     ws.add_table(table)
 
     # === 4: Nedtrekksmenyer
-    headers = [ws.cell(row=data_start_row, column=c).value for c in range(1, max_col + 1)]
     for col in range(1, max_col + 1):
         header = headers[col - 1]
         col_letter = get_column_letter(col)
@@ -125,7 +205,82 @@ for navn, gruppe in df.groupby("Navn"):
         ws.cell(row=sum_start_row + 8, column=1).value = "⚠️ Type-kolonne ikke funnet"
 
     wb.save(filnavn)
-    print(f"✅ Lagret: {filnavn}")
+    return filnavn, time.perf_counter() - start
+
+
+def _rapporter(ferdige):
+    tider = []
+    for filnavn, sekunder in ferdige:
+        print(f"✅ Lagret: {filnavn} ({sekunder:.2f} s)")
+        tider.append(sekunder)
+    return tider
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lag én Excel-fil per person fra Cristin-CSV-en.")
+    parser.add_argument("--input", default=INPUT_CSV, help="CSV fra cristin_fetcher.py")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Katalog for Excel-filene")
+    kolonnelager.legg_til_lagerargumenter(parser, lese=True)
+    parser.add_argument("--start", type=int, help="Første år (kun med --from-store)")
+    parser.add_argument("--end", type=int, help="Siste år (kun med --from-store)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Hopp over uendrede personer og bevar utfylte merknader i endrede filer")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Antall prosesser (1 = sekvensielt)")
+    statistikk.legg_til_statistikkargument(parser)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # === Les CSV ===
+    with statistikk.fase("lesing"):
+        if args.from_store:
+            df = klargjor(les_fra_lager(args.from_store, args.start, args.end))
+        else:
+            df = les_og_klargjor(args.input)
+    kolonner = list(df.columns)
+
+    # === Gruppér per person og lag Excel-filer ===
+    manifest_fil = os.path.join(args.output_dir, MANIFEST)
+    manifest = {}
+    if args.incremental and os.path.exists(manifest_fil):
+        with open(manifest_fil, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    jobber = []
+    nye_hasher = {}
+    uendret = 0
+    with statistikk.fase("gruppering"):
+        grupper = list(df.groupby("Navn"))
+    for navn, gruppe in grupper:
+        filnavn = filnavn_for(navn, args.output_dir)
+        rader = list(gruppe.itertuples(index=False, name=None))
+        hash_ = innholdshash(kolonner, rader)
+        nye_hasher[os.path.basename(filnavn)] = hash_
+        # I inkrementell modus hoppes personer med uendret input over, og merknader flettes inn i resten
+        if args.incremental and manifest.get(os.path.basename(filnavn)) == hash_ and os.path.exists(filnavn):
+            uendret += 1
+            continue
+        jobber.append((filnavn, kolonner, rader, args.incremental))
+
+    with statistikk.fase("arbeidsbøker"):
+        if args.workers > 1 and len(jobber) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                tider = _rapporter(pool.map(lag_arbeidsbok, *zip(*jobber)))
+        else:
+            tider = _rapporter(lag_arbeidsbok(*jobb) for jobb in jobber)
+
+    with open(manifest_fil, "w", encoding="utf-8") as f:
+        json.dump({**manifest, **nye_hasher}, f, ensure_ascii=False, indent=2)
+    if args.incremental:
+        print(f"⏭️  {uendret} filer uendret, {len(jobber)} oppdatert")
+
+    print(f"🎯 Ferdig! {len(jobber)} filer på {time.perf_counter() - start:.2f} s")
+    statistikk.skriv_rapport(args.stats_file, arbeidsbøker={
+        "rader": len(df), "personer": len(grupper), "skrevet": len(jobber), "uendret": uendret,
+        "workers": args.workers,
+        "sekunder_per_fil": {"sum": round(sum(tider), 3), "maks": round(max(tider, default=0), 3)}})
 
-print("🎯 Ferdig!")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Skriptene ligger i rotkatalogen og importeres som moduler
+ROT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROT)
+
+
+@pytest.fixture
+def mock_api():
+    # Mock-API-et (mock_cristin_server.py) i en egen tråd på en ledig port; mock.teller teller kallene
+    import mock_cristin_server
+
+    mock = mock_cristin_server.MockCristin(mock_cristin_server.lag_fixtures(300, 20))
+    server = mock_cristin_server.start_server(mock)
+    mock.base = f"http://127.0.0.1:{server.server_port}/v2"
+    yield mock
+    server.shutdown()
+
+
+@pytest.fixture
+def kjor(tmp_path):
+    # Kjører et av skriptene mot mock-API-et i en egen prosess, med tmp_path som arbeidskatalog
+    def kjor(mock, skript, *argumenter):
+        miljo = {**os.environ, "CRISTIN_API_BASE": mock.base}
+        return subprocess.run([sys.executable, os.path.join(ROT, skript), "--no-cache", "--rate", "1000",
+                               *argumenter], cwd=tmp_path, env=miljo, capture_output=True, text=True, check=True)
+
+    return kjor
@@ -0,0 +1,17 @@
+import cristin_fetcher as fetcher
+from cristin_journal import Journal
+
+
+def test_journal_fra_annet_utvalg_gjenbrukes_ikke(mock_api, kjor, tmp_path):
+    # En avbrutt kjøring for 2018–2024 har lagt igjen en journal; et gjenopptak for 2020–2024 skal hente på nytt
+    ids = [str(100000 + i) for i in range(5)]
+    (tmp_path / "ids.txt").write_text("\n".join(ids))
+    journal = Journal(str(tmp_path / fetcher.journalfil(ids, 2018, 2024)))
+    journal.registrer(ids[0], [{"Cristin-ID": ids[0], "Tittel": "Fra gammel journal"}])
+    journal.avslutt(slett=False)
+
+    kjor(mock_api, "cristin_fetcher.py", "--ids", "ids.txt", "--start", "2020", "--end", "2024", "--resume")
+
+    # Alle fem personene hentes, også den som stod som ferdig i den andre journalen
+    assert "Fra gammel journal" not in (tmp_path / fetcher.OUTPUT_FILE).read_text(encoding="utf-8")
+    assert mock_api.teller["person"] == len(ids)
@@ -0,0 +1,35 @@
+import json
+
+import cristin_kolonnelager as kolonnelager
+
+
+def _hoest(katalog, hentet, aar):
+    skriver = kolonnelager.Lagerskriver(str(katalog), "unit")
+    skriver.hentet = hentet
+    skriver.legg_til("results", {"cristin_result_id": "1", "aar": aar, "unit_id": "1.0.0.0"})
+    skriver.lukk()
+
+
+def test_nyere_hoesting_fortrenger_rad_utenfor_filteret(tmp_path):
+    # Året er rettet fra 2019 til 2021 i en nyere høsting; et 2018–2020-filter skal ikke gi den gamle raden
+    _hoest(tmp_path, "2024-01-01T00:00:00+00:00", 2019)
+    _hoest(tmp_path, "2024-06-01T00:00:00+00:00", 2021)
+
+    assert kolonnelager.les_tabell("results", str(tmp_path), kolonner=["aar"],
+                                   filter=kolonnelager.aarsfilter(2018, 2020)).empty
+    assert kolonnelager.les_tabell("results", str(tmp_path), kolonner=["aar"],
+                                   filter=kolonnelager.aarsfilter(2020, 2022))["aar"].tolist() == [2021]
+
+
+def test_analyse_fra_lager_uten_nettkall(mock_api, kjor, tmp_path):
+    # En unit-høsting med --store skal gi samarbeid_analyse.py --from-store alt den trenger
+    kjor(mock_api, "hent_unit_publikasjoner.py", "--unit", "1.0.0.0", "--start", "2018", "--end", "2024",
+         "--store", "lager", "--concurrency", "4")
+    mock_api.nullstill()
+
+    kjor(mock_api, "samarbeid_analyse.py", "--unit", "1.0.0.0", "--start", "2018", "--end", "2024",
+         "--from-store", "lager", "--stats-file", "stats.json")
+
+    assert mock_api.teller["totalt"] == 0
+    stats = json.loads((tmp_path / "stats.json").read_text())
+    assert stats["totals"]["requests"] == 0
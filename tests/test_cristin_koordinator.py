@@ -0,0 +1,10 @@
+import cristin_koordinator as koordinator
+
+
+def test_siste_sideshard_blar_til_tom_side(monkeypatch):
+    # Fem sider ifølge X-Total-Count, to sider per shard: den siste shardens øvre grense er åpen
+    monkeypatch.setattr(koordinator, "antall_sider", lambda *args: 5)
+
+    shards = koordinator.lag_unitshards(["1.0.0.0"], 2020, 2020, sider_per_shard=2)
+
+    assert [(s["forste_side"], s["siste_side"]) for s in shards] == [(1, 2), (3, 4), (5, None)]
@@ -0,0 +1,14 @@
+import asyncio
+
+from cristin_parallell import kjor_parallelt
+
+
+def test_rekkefolgen_beholdes():
+    assert kjor_parallelt(lambda x: x * 2, range(50), samtidighet=8) == [x * 2 for x in range(50)]
+
+
+def test_kan_kalles_fra_en_kjorende_lokke():
+    async def inni():
+        return kjor_parallelt(str, [1, 2, 3], samtidighet=4)
+
+    assert asyncio.run(inni()) == ["1", "2", "3"]
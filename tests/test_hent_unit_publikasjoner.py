@@ -0,0 +1,74 @@
+import pytest
+
+import cristin_poster as poster
+import hent_unit_publikasjoner as eksport
+from cristin_journal import Journal
+
+
+class Avbrudd(Exception):
+    pass
+
+
+def _side(*args, **kwargs):
+    # Én listeside med fem resultater
+    yield 1, [poster.Resultat(str(rid), 2020) for rid in range(1, 6)]
+
+
+def test_gjenopptak_midt_paa_en_side(tmp_path, monkeypatch):
+    monkeypatch.setattr(eksport, "paginer_sider", _side)
+    filnavn = str(tmp_path / "journal.jsonl")
+
+    # Første kjøring stopper på det tredje resultatet; de to første står allerede i journalen
+    behandlet = []
+
+    def lag_rad(post, *args, **kwargs):
+        if post.resultat_id == "3":
+            raise Avbrudd
+        behandlet.append(post.resultat_id)
+        return {"Cristin Resultat-ID": post.resultat_id}
+
+    monkeypatch.setattr(eksport, "lag_rad", lag_rad)
+    journal = Journal(filnavn)
+    with pytest.raises(Avbrudd):
+        list(eksport.hent_publikasjoner_for_unit("1.0.0.0", 2020, 2020, journal=journal))
+    journal.avslutt(slett=False)
+    assert behandlet == ["1", "2"]
+
+    # Gjenopptaket behandler bare resten, og radene kommer i samme rekkefølge som listen
+    behandlet.clear()
+    monkeypatch.setattr(eksport, "lag_rad", lambda post, *args, **kwargs:
+                        behandlet.append(post.resultat_id) or {"Cristin Resultat-ID": post.resultat_id})
+    journal = Journal(filnavn, gjenoppta=True)
+    rader = list(eksport.hent_publikasjoner_for_unit("1.0.0.0", 2020, 2020, journal=journal))
+    journal.avslutt(slett=False)
+    assert behandlet == ["3", "4", "5"]
+    assert [rad["Cristin Resultat-ID"] for rad in rader] == ["1", "2", "3", "4", "5"]
+
+    # En side som er ferdig, leses i sin helhet fra journalen uten ny listing
+    monkeypatch.setattr(eksport, "paginer_sider", lambda *args, **kwargs: iter(()))
+    journal = Journal(filnavn, gjenoppta=True)
+    rader = list(eksport.hent_publikasjoner_for_unit("1.0.0.0", 2020, 2020, journal=journal))
+    journal.avslutt()
+    assert [rad["Cristin Resultat-ID"] for rad in rader] == ["1", "2", "3", "4", "5"]
+
+
+def test_feilet_listeside_beholder_deltabildet(mock_api, kjor, tmp_path):
+    # En listeside som svarer 404 (ikke forbigående) gir en avkortet liste; resultatene skal ikke
+    # regnes som fjernet, og bildet fra forrige kjøring skal stå urørt
+    argumenter = ["--unit", "1.0.0.0", "--start", "2018", "--end", "2024", "--delta", "bilde.json.gz"]
+    kjor(mock_api, "hent_unit_publikasjoner.py", *argumenter, "--changes", "forste.csv")
+    bilde = (tmp_path / "bilde.json.gz").read_bytes()
+
+    del mock_api.f["units"]["1.0.0.0"]
+    kjor(mock_api, "hent_unit_publikasjoner.py", *argumenter, "--changes", "andre.csv")
+
+    assert (tmp_path / "bilde.json.gz").read_bytes() == bilde
+    assert not (tmp_path / "andre.csv").exists()
+
+
+def test_delta_avvises_sammen_med_lager(capsys):
+    # Gjenbrukte rader ville manglet i kolonnelageret
+    with pytest.raises(SystemExit):
+        eksport.main(["--unit", "1.0.0.0", "--delta", "--store"])
+
+    assert "--delta kan ikke kombineres med --store" in capsys.readouterr().err
@@ -0,0 +1,38 @@
+import samarbeid_analyse as samarbeid
+
+
+def test_uten_artikler_gir_tomme_resultater():
+    # Ingen fagfellevurderte artikler (f.eks. år uten publikasjoner) skal gi nuller, ikke ValueError fra merge
+    stats = samarbeid.analyser_samarbeid([], set(), kanter=True, matrise=True)
+
+    assert (stats["uten"], stats["nasjonale"], stats["internasjonale"]) == (0, 0, 0)
+    assert stats["antall_institusjoner"] == 0
+    assert stats["institusjonsteller"].empty
+    assert stats["kanter"].empty
+    assert list(stats["kanter"].columns) == ["institusjon_a", "institusjon_b", "artikler"]
+    assert stats["matrise"].empty
+
+
+def test_tom_rapport_kan_skrives(tmp_path, capsys):
+    stats = samarbeid.analyser_samarbeid([], set(), kanter=True, matrise=True)
+    samarbeid.skriv_samarbeid(stats, kanter=tmp_path / "kanter.csv", matrise=tmp_path / "matrise.csv")
+
+    assert "Uten samarbeidspartnere: 0" in capsys.readouterr().out
+    assert (tmp_path / "kanter.csv").read_text().strip() == "institusjon_a,institusjon_b,artikler"
+
+
+def test_kanter_og_matrise_bygges_bare_ved_behov():
+    stats = samarbeid.analyser_samarbeid([], set())
+
+    assert "kanter" not in stats and "matrise" not in stats
+
+
+def test_dedupliserte_referanser_telles_som_treff(monkeypatch):
+    # Tre affiliasjoner mot samme unit gir ett oppslag (bom) og to treff
+    monkeypatch.setattr(samarbeid, "oppslag_teller", samarbeid.Counter())
+    kall = []
+
+    samarbeid._slaa_opp_alle(lambda *ref: kall.append(ref), [("1.0.0.0", "u")] * 3, 2, "unit_treff")
+
+    assert kall == [("1.0.0.0", "u")]
+    assert samarbeid.oppslag_teller["unit_treff"] == 2
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+ROT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importerer_ikke_http_klienten():
+    # Oppsplittingen gjør ingen nettkall; statistikkmodulen skal ikke dra inn klienten, cachen eller requests
+    kode = ("import sys, split_per_person_excel; "
+            "print(sorted({'requests', 'cristin_cache', 'cristin_klient'} & set(sys.modules)))")
+    ut = subprocess.run([sys.executable, "-c", kode], cwd=ROT, capture_output=True, text=True, check=True).stdout
+    assert ut.strip() == "[]"
@@ -0,0 +1,19 @@
+import hent_unit_publikasjoner as eksport
+import samarbeid_analyse as samarbeid
+import unit_rapport
+
+
+def test_rapport_uten_artikler(tmp_path, monkeypatch, capsys):
+    # Ingen resultater i perioden: eksporten og samarbeidsstatistikken skal fullføres med nuller
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(eksport, "hent_publikasjoner_for_units", lambda *args, **kwargs: iter(()))
+    monkeypatch.setattr(samarbeid, "hent_eget_universitetsnavn", lambda unit: "Eget universitet")
+
+    unit_rapport.main(["--unit", "1.0.0.0", "--start", "1990", "--end", "1991", "--no-cache",
+                       "--edges", "kanter.csv", "--matrix", "matrise.csv"])
+
+    ut = capsys.readouterr().out
+    assert "Antall peer reviewed publikasjoner funnet: 0" in ut
+    assert "Uten samarbeidspartnere: 0" in ut
+    assert (tmp_path / "kanter.csv").exists()
+    assert (tmp_path / "matrise.csv").exists()
@@ -0,0 +1,71 @@
+import argparse
+from datetime import datetime
+
+import cristin_klient
+import cristin_kolonnelager as kolonnelager
+import cristin_referanse as referanse
+import cristin_statistikk as statistikk
+import hent_unit_publikasjoner as eksport
+import samarbeid_analyse as samarbeid
+from cristin_parallell import kjor_parallelt
+from cristin_planlegger import skriv_oppsummering
+
+# Unit-rapport: eksporten fra hent_unit_publikasjoner.py og samarbeidsstatistikken fra samarbeid_analyse.py
+# i én gjennomgang av resultatlistene. Hver side brukes til begge deler mens den er i minnet, og
+# bidragsyterne som eksporten henter, ligger i minnecachen når samarbeidsanalysen trenger dem.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Eksport og samarbeidsstatistikk for en eller flere units i én kjøring.")
+    referanse.legg_til_unitargumenter(parser)
+    parser.add_argument("--start", type=int, default=2015, help="Startår")
+    parser.add_argument("--end", type=int, default=datetime.now().year, help="Sluttår")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="Filformat for eksporten")
+    parser.add_argument("--top", type=int, default=10, help="Antall institusjoner og land i utskriften")
+    parser.add_argument("--edges", help="Skriv samforfatterkanter (institusjonspar) til denne CSV-filen")
+    parser.add_argument("--matrix", help="Skriv institusjon×år-matrisen til denne CSV-filen")
+    kolonnelager.legg_til_lagerargumenter(parser)
+    statistikk.legg_til_statistikkargument(parser)
+    cristin_klient.legg_til_http_argumenter(parser)
+    args = parser.parse_args(argv)
+    cristin_klient.konfigurer_fra_args(args)
+    kolonnelager.aktiver(args.store, "report")
+    indeks = referanse.aktiver(args.ref_index)
+    if indeks is not None:
+        samarbeid.last_oppslag_fra_indeks(indeks)
+    units = referanse.units_fra_args(args)
+    samtidighet = cristin_klient.samtidighet
+
+    # Fagfellevurderte artikler og bidragsyterne deres samles side for side mens eksporten skrives
+    artikler = []
+    bidragsytere = {}
+
+    def per_side(poster):
+        utvalgte = [p for p in poster if p.kategori_kode in samarbeid.PEER_REVIEWED_CATEGORIES]
+        with statistikk.fase("bidragsytere"):
+            funn = kjor_parallelt(samarbeid.hent_affiliasjoner, utvalgte, samtidighet)
+        artikler.extend(utvalgte)
+        bidragsytere.update((p.resultat_id, personer) for p, personer in zip(utvalgte, funn))
+
+    eksport.lagre_resultater(eksport.hent_publikasjoner_for_units(units, args.start, args.end,
+                                                                  samtidighet=samtidighet, per_side=per_side),
+                             args.format)
+    print(f"🔍 Antall peer reviewed publikasjoner funnet: {len(artikler)}")
+
+    egne_institusjoner = {navn for navn in map(samarbeid.hent_eget_universitetsnavn, units) if navn}
+    stats = samarbeid.analyser_samarbeid(artikler, egne_institusjoner, samtidighet, bidragsytere=bidragsytere,
+                                         kanter=bool(args.edges), matrise=bool(args.matrix))
+    samarbeid.skriv_samarbeid(stats, args.top, args.edges, args.matrix)
+
+    print()
+    skriv_oppsummering()
+    kolonnelager.avslutt()
+    referanse.avslutt()
+    statistikk.skriv_rapport(args.stats_file, oppslag=dict(samarbeid.oppslag_teller),
+                             artikler={"uten": stats["uten"], "nasjonale": stats["nasjonale"],
+                                       "internasjonale": stats["internasjonale"]})
+    cristin_klient.avslutt()
+
+
+if __name__ == "__main__":
+    main()